@@ -17,6 +17,9 @@ from gui.core.colors import *
 # -----------------------------
 @AppMsg.register
 class RpsMove(BadgeMsg):
+    _tid = 0x30
+    _fields = (("weapon", "s"),)
+
     def __init__(self, weapon=None):
         super().__init__()
         self.weapon = weapon
@@ -24,6 +27,9 @@ class RpsMove(BadgeMsg):
 
 @AppMsg.register
 class MatchOver(BadgeMsg):
+    _tid = 0x31
+    _fields = (("winner", "s"),)
+
     def __init__(self, winner=None):
         super().__init__()
         self.winner = winner
@@ -31,6 +37,9 @@ class MatchOver(BadgeMsg):
 
 @AppMsg.register
 class Nickname(BadgeMsg):
+    _tid = 0x32
+    _fields = (("nick", "s"),)
+
     def __init__(self, nick=None):
         super().__init__()
         self.nick = nick
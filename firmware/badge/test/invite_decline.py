@@ -0,0 +1,102 @@
+import asyncio
+import sys
+from time import ticks_ms, ticks_diff
+
+# Regression test for declined invites: a challenger gets the decline of a
+# host with a full invite table as the reply to its connect(), and no
+# invite is opened on either side. Both badges live in this one process,
+# the stubbed driver loops frames sent to one mac back as coming from the
+# other, so NowListener plays challenger and host at once.
+try:
+    import aioespnow
+except ImportError:
+
+    class aioespnow:
+        AIOESPNow = object
+
+    sys.modules["aioespnow"] = aioespnow
+
+from bdg.msg.connection import Connection, NowListener
+from bdg.msg.peers import peers
+
+CHALLENGER = b"\x02\x00\x00\x00\x00\x0a"
+HOST = b"\x02\x00\x00\x00\x00\x0b"
+CON_ID = 2
+
+
+class LoopbackEspNow:
+    """Driver stand-in, a frame sent to one mac is received from the other"""
+
+    other = {CHALLENGER: HOST, HOST: CHALLENGER}
+
+    def __init__(self):
+        self.buf = []
+        self.ready = asyncio.Event()
+        self.peers_table = {CHALLENGER: [-40, 0], HOST: [-40, 0]}
+
+    def get_peers(self):
+        return ()
+
+    def add_peer(self, mac):
+        pass
+
+    def del_peer(self, mac):
+        pass
+
+    async def asend(self, mac, msg, sync=True):
+        self.buf.append((self.other[mac], bytes(msg)))
+        self.ready.set()
+
+    async def airecv(self):
+        while not self.buf:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.buf.pop(0)
+
+
+invites = []
+
+
+async def con_cb(conn, req=False):
+    invites.append((conn.c_mac, conn.con_id))
+    return True
+
+
+async def connect_timed(e):
+    # challenger side, its connection to HOST
+    conn = Connection(HOST, CON_ID, e)
+    t0 = ticks_ms()
+    ok = await conn.connect()
+    return ok, ticks_diff(ticks_ms(), t0)
+
+
+async def main():
+    e = LoopbackEspNow()
+    NowListener.con_cb = con_cb
+    NowListener.start(e)
+
+    # host invite table full, the challenger is declined right away
+    NowListener.max_invites = 0
+    ok, took = await connect_timed(e)
+    print(f"declined: connected={ok} in {took}ms, invites {invites}")
+    assert ok is False
+    assert took < 5000, "decline did not reach connect()"
+    assert not invites, "decline opened an invite"
+    assert not NowListener.pending_invites
+    await asyncio.sleep(1)  # late retries and duplicates of the decline
+    assert not invites and not NowListener.pending_invites
+    # the declined connection is gone with its peer slot pin
+    assert not NowListener.connections, "declined connection still registered"
+    assert not NowListener.served and not peers.pinned
+
+    # room again, the host accepts through con_cb
+    NowListener.max_invites = 4
+    ok, took = await connect_timed(e)
+    print(f"accepted: connected={ok} in {took}ms, invites {invites}")
+    assert ok is True
+    assert invites == [(CHALLENGER, CON_ID)]
+    print("invite_decline: OK")
+    NowListener.stop()
+
+
+asyncio.run(main())
@@ -0,0 +1,115 @@
+import asyncio
+import sys
+from time import ticks_ms, ticks_diff
+
+# Regression test for the NowListener receive loop: a flood of beacons from
+# many badges is drained in bursts of rx_budget frames, the loop yields
+# between bursts and the rest of the system keeps running. Runs without
+# radio, aioespnow is stubbed when the port has none.
+try:
+    import aioespnow
+except ImportError:
+
+    class aioespnow:
+        AIOESPNow = object
+
+    sys.modules["aioespnow"] = aioespnow
+
+from bdg.msg import BeaconMsg
+from bdg.msg.connection import NowListener, RxRing
+
+BADGES = 50
+FRAMES = 600
+BATCH = 24  # frames the fake driver receives per 20 ms, 1200 frames/s
+
+
+class FakeEspNow:
+    """Driver stand-in, airecv() returns buffered frames and waits when empty"""
+
+    def __init__(self):
+        self.buf = []
+        self.ready = asyncio.Event()
+        self.peers_table = {}
+
+    def get_peers(self):
+        return ()
+
+    def add_peer(self, mac):
+        pass
+
+    def del_peer(self, mac):
+        pass
+
+    async def asend(self, mac, msg, sync=True):
+        pass
+
+    def receive(self, mac, frame):
+        self.peers_table[mac] = [-50, ticks_ms()]
+        self.buf.append((mac, frame))
+        self.ready.set()
+
+    async def airecv(self):
+        while not self.buf:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.buf.pop(0)
+
+
+async def radio(e):
+    macs = [bytes((0x02, 0, 0, 0, 0, n)) for n in range(BADGES)]
+    frames = [BeaconMsg.pack(f"badge{n}") for n in range(BADGES)]
+    for i in range(FRAMES):
+        e.receive(macs[i % BADGES], frames[i % BADGES])
+        if i % BATCH == BATCH - 1:
+            await asyncio.sleep_ms(20)
+
+
+async def main():
+    e = FakeEspNow()
+    # room for a whole batch, so bursts longer than rx_budget queue up
+    NowListener.rx_ring = RxRing(size=BATCH + 8)
+    listener = NowListener.start(e)
+
+    turns = 0
+    seen = []  # value of turns when each frame was handled
+    on_beacon = NowListener.handlers[BeaconMsg._tid]
+
+    async def counting(msg, mac, rssi):
+        seen.append(turns)
+        await on_beacon(msg, mac, rssi)
+
+    NowListener.subscribe(BeaconMsg, counting)
+
+    t0 = ticks_ms()
+    sender = asyncio.create_task(radio(e))
+    last, max_gap = ticks_ms(), 0
+    while not sender.done() or e.buf or NowListener.rx_ring.count:
+        await asyncio.sleep(0)
+        turns += 1
+        now = ticks_ms()
+        max_gap = max(max_gap, ticks_diff(now, last))
+        last = now
+    took = ticks_diff(ticks_ms(), t0)
+
+    # longest run of frames handled without the loop giving others a turn
+    run = longest = 0
+    for n in range(len(seen)):
+        run = run + 1 if n and seen[n] == seen[n - 1] else 1
+        longest = max(longest, run)
+
+    ring = NowListener.rx_ring
+    print(f"{len(seen)} frames in {took}ms, ring dropped {ring.dropped}")
+    print(f"ui turns {turns}, longest burst {longest}, max gap {max_gap}ms")
+    print(f"badges seen {len(NowListener.last_seen)}")
+
+    assert not listener.done(), "listener task died"
+    assert len(seen) + ring.dropped + NowListener.rx_limit.dropped == FRAMES
+    assert len(seen) > FRAMES * 9 // 10, "receive loop cannot keep up"
+    assert longest <= NowListener.rx_budget, "no yield after rx_budget frames"
+    assert max_gap < 100, "receive loop starves other tasks"
+    assert len(NowListener.last_seen) == BADGES
+    print("rx_burst: OK")
+    NowListener.stop()
+
+
+asyncio.run(main())
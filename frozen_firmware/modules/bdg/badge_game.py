@@ -4,6 +4,7 @@ import random
 from bdg.utils import fwdbutton
 from bdg.msg import BadgeAdr, null_badge_adr
 from bdg.msg.connection import NowListener
+from bdg.msg.updates import BADGE_ADDED, BADGE_UPDATED
 from bdg.asyncbutton import ButtonEvents
 from bdg.utils import singleton, Timer
 from bdg.config import Config
@@ -202,10 +203,12 @@ class ActiveGameScr(Screen):
         self.update_ui()
 
     async def listen_handler(self):
-        async for opponent in NowListener.updates(filer_mac=self.opponent.mac):
-            print(f"listen_handler: {opponent}")
-            self.opponent = opponent
-            self.update_ui()
+        async for batch in NowListener.updates(filter_mac=self.opponent.mac):
+            for diff in batch:
+                if diff.kind in (BADGE_ADDED, BADGE_UPDATED):
+                    print(f"listen_handler: {diff.badge}")
+                    self.opponent = diff.badge
+                    self.update_ui()
 
     def after_open(self):
         self.game = BadgeGame()
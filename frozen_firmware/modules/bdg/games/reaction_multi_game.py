@@ -15,6 +15,9 @@ from bdg.msg import AppMsg, BadgeMsg, CancelActivityMsg
 @AppMsg.register
 class ReactionStart(BadgeMsg):
     """Exchange random seeds between badges"""
+    _tid = 0x28
+    _fields = (("my_seed", "I"),)
+
     def __init__(self, my_seed: int):
         super().__init__()
         self.my_seed = my_seed
@@ -23,6 +26,9 @@ class ReactionStart(BadgeMsg):
 @AppMsg.register
 class ReactionEnd(BadgeMsg):
     """Send final score when game over"""
+    _tid = 0x29
+    _fields = (("final_score", "i"),)
+
     def __init__(self, final_score: int):
         super().__init__()
         self.final_score = final_score
@@ -18,6 +18,9 @@ from bdg.games.winner_screen import WinScr
 # -----------------------------
 @AppMsg.register
 class RpsMove(BadgeMsg):
+    _tid = 0x30
+    _fields = (("weapon", "s"),)
+
     def __init__(self, weapon=None):
         super().__init__()
         self.weapon = weapon
@@ -25,6 +28,9 @@ class RpsMove(BadgeMsg):
 
 @AppMsg.register
 class MatchOver(BadgeMsg):
+    _tid = 0x31
+    _fields = (("winner", "s"),)
+
     def __init__(self, winner=None):
         super().__init__()
         self.winner = winner
@@ -32,6 +38,9 @@ class MatchOver(BadgeMsg):
 
 @AppMsg.register
 class Nickname(BadgeMsg):
+    _tid = 0x32
+    _fields = (("nick", "s"),)
+
     def __init__(self, nick=None):
         super().__init__()
         self.nick = nick
@@ -180,7 +189,7 @@ class RpsScreen(Screen):
             await asyncio.sleep(0.1)
 
         async for msg in self.conn.get_msg_aiter():
-            print("RPS RECEIVED:", msg.msg_type, msg.__dict__)
+            print("RPS RECEIVED:", msg.msg_type, msg.fields())
 
             if msg.msg_type == "ConTerm":
                 self.ready_for_input = False
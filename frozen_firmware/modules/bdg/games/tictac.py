@@ -25,6 +25,9 @@ NEW_ROUND = 3
 
 @AppMsg.register
 class TttStart(BadgeMsg):
+    _tid = 0x20
+    _fields = (("iam", "s"), ("move", "b"), ("init", "f"), ("round_num", "B"))
+
     def __init__(self, iam: str, move: int, init: float, round_num: int):
         super().__init__()
         self.iam: str = iam  # Player character: "x" or "o"
@@ -35,6 +38,9 @@ class TttStart(BadgeMsg):
 
 @AppMsg.register
 class TttMove(BadgeMsg):
+    _tid = 0x21
+    _fields = (("move", "b"),)
+
     def __init__(self, move: int):
         super().__init__()
         self.move: int = move
@@ -42,6 +48,9 @@ class TttMove(BadgeMsg):
 
 @AppMsg.register
 class TttEnd(BadgeMsg):
+    _tid = 0x22
+    _fields = (("iam_winner", "?"), ("move", "b"))
+
     def __init__(self, iam_winner: bool, move: int):
         super().__init__()
         # if player does not claim win, it must be tie
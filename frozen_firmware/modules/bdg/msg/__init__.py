@@ -5,32 +5,86 @@ import random
 
 from time import time
 
-import umsgpack
+from bdg.msg.codec import CORE_HEAD, CONTENT_HEAD, Layout, frame_tid, name_tid
+from bdg.msg.peers import peers
+from bdg.msg.timers import wheel
+
+MAX_FRAME = 250  # ESP-NOW payload limit in bytes
 
 
 # Low level messages that handle connection link
 class BadgeMsg(object):
-    __message_id = random.randint(0,255)
+    __slots__ = ("_id",)  # subclasses without __slots__ get a __dict__
+    _message_id = random.randint(0, 0xFFFF)
 
     # store all known message types trough .register decorator
-    __msg_type_reg = {}
-    __core_types = ()
+    _msg_type_reg = {}  # class name -> class
+    _tid_reg = {}  # wire type id -> class
+
+    # Wire format, see bdg.msg.codec. Subclasses declare their own
+    _tid: int = None
+    _fields: tuple = None
+    _layout: Layout = None
+    _core = False  # registered with BadgeMsg.register, carries msg id
+    msg_type: str = None
+
+    # Freelist of the hot message types, a class opts in with __slots__ and
+    # its own _pool = [], see take() and free()
+    _pool: list = None
+    pool_size = 4
 
     @property
     def id(self):
-        return  self.__id % 255
+        return self._id & 0xFFFF
 
     def __init__(self):
-        if type(self) in BadgeMsg.__core_types:
-            BadgeMsg.__message_id += 1
-            self.__id = BadgeMsg.__message_id
-        self.msg_type: str = type(self).__name__
+        if self._core:
+            BadgeMsg._message_id += 1
+            self._id = BadgeMsg._message_id
+
+    def fields(self):
+        if self._fields is not None:
+            return {name: getattr(self, name) for name, _ in self._fields}
+        # public instance fields, used by messages without a _fields layout
+        return {
+            k: v
+            for k, v in self.__dict__.items()
+            if not k.startswith("_") and not callable(v)
+        }
+
+    @classmethod
+    def take(cls, *args):
+        """
+        cls(*args), reusing an instance from the freelist of pooled classes.
+        Decoding takes every message through here, hand it back with free()
+        once nothing refers to it.
+        """
+        pool = cls._pool
+        if pool:
+            msg = pool.pop()
+            msg.__init__(*args)
+            return msg
+        return cls(*args)
+
+    def free(self):
+        # returns a message of a pooled class to the freelist, no-op otherwise
+        pool = self._pool
+        if pool is not None and len(pool) < self.pool_size and self not in pool:
+            pool.append(self)
+
+    @classmethod
+    def pack(cls, *args) -> bytes:
+        # serialized cls(*args) for fire and forget sends, the instance is recycled
+        msg = cls.take(*args)
+        frame = msg.srlz()
+        msg.free()
+        return frame
 
     def to_dict(self):
-        d = {"_id": self.id} if type(self) in BadgeMsg.__core_types else dict()
-        for k, v in self.__dict__.items():
-            if k.startswith("__") or callable(v):
-                continue
+        d = {"msg_type": self.msg_type}
+        if self._core:
+            d["_id"] = self.id
+        for k, v in self.fields().items():
             if isinstance(v, BadgeMsg):
                 d.update({k: v.to_dict()})
             else:
@@ -42,63 +96,69 @@ class BadgeMsg(object):
         return str(self.to_dict())
 
     def srlz(self):
-        return umsgpack.dumps(self.to_dict())
+        return self._layout.dumps(self)
 
     @classmethod
-    def register(cls, subclass):
-        def decorator(subclz):
-            # print(f"{cls=} ad {subclz=}")
-            cls.__msg_type_reg[subclz.__name__] = subclz
-            cls.__registered_messages = cls.__msg_type_reg.keys()
-            cls.__core_types = tuple(cls.__msg_type_reg.values())
-            return subclz
-
-        return decorator(subclass)
+    def register(cls, subclz):
+        # compile wire layout of subclz and add it to registry of cls
+        tid = subclz._tid
+        if tid is None:
+            tid = name_tid(subclz.__name__)
+        other = cls._tid_reg.get(tid)
+        if other is not None and other.__name__ != subclz.__name__:
+            raise ValueError(
+                f"msg type id {tid} of {subclz.__name__} used by {other.__name__}"
+            )
+        subclz._tid = tid
+        subclz._core = cls is BadgeMsg
+        subclz.msg_type = subclz.__name__
+        subclz._layout = Layout(
+            subclz,
+            CORE_HEAD if subclz._core else CONTENT_HEAD,
+            subclz._fields,
+            subclz._tid_reg,
+        )
+        cls._tid_reg[tid] = subclz
+        cls._msg_type_reg[subclz.__name__] = subclz
+        return subclz
 
     @staticmethod
-    def desrlz(dump) -> "BadgeMsg":
+    def desrlz(dump, end=None) -> "BadgeMsg":
+        # dump can be a memoryview of a preallocated receive buffer, end is
+        # then the length of the frame in it
         # Lightweight guards to avoid crashes and OOM from malformed or oversized payloads
         MAX_MSG_BYTES = 4096
         try:
-            if not isinstance(dump, (bytes, bytearray)):
+            if not isinstance(dump, (bytes, bytearray, memoryview)):
                 print("desrlz: non-bytes payload")
                 return None
-            if len(dump) > MAX_MSG_BYTES:
-                print("desrlz: oversized payload", len(dump))
+            if end is None:
+                end = len(dump)
+            if end > MAX_MSG_BYTES:
+                print("desrlz: oversized payload", end)
                 return None
-
-            d = umsgpack.loads(dump)
-
-            if not isinstance(d, dict):
-                print("desrlz: unpacked payload is not a dict")
-                return None
-
-            ctype = d.get("msg_type")
-            mid = d.get("_id")
-            if not isinstance(ctype, str) or not isinstance(mid, int):
-                print("desrlz: invalid header types", ctype, mid)
+            tid = frame_tid(dump, end)
+            if tid is None:
+                print("desrlz: no badge header, len", end)
                 return None
 
-            rest = {k: v for k, v in d.items() if k not in ["msg_type", "_id"]}
-
-            ctor = BadgeMsg.__msg_type_reg.get(ctype)
+            ctor = BadgeMsg._tid_reg.get(tid)
             if ctor is None:
-                print(f"desrlz: unknown msg_type {ctype}")
+                print(f"desrlz: unknown msg type id {tid}")
                 return None
 
             try:
-                msg = ctor(**rest)
+                msg, off = ctor._layout.loads(dump, 0, end)
             except TypeError as e:
-                print(f"desrlz: ctor TypeError for {ctype}: {e}")
-                return None
-            except Exception as e:
-                print(f"desrlz: ctor raised for {ctype}: {e}")
+                print(f"desrlz: ctor TypeError for {ctor.msg_type}: {e}")
                 return None
 
-            msg.__id = mid
+            if off != end:
+                print(f"desrlz: {end - off} trailing bytes")
+                return None
             return msg
         except Exception as e:
-            h = dump[:32] if isinstance(dump, (bytes, bytearray)) else b""
+            h = bytes(dump[: min(end, 32)])
             print(f"Error deserializing msg: {e}, head={h.hex()}")
             return None
 
@@ -109,18 +169,43 @@ class BadgeMsg(object):
 # Low level message that handle connection link
 @BadgeMsg.register
 class BeaconMsg(BadgeMsg):
-    def __init__(self, nick: str):
+    __slots__ = ("nick", "games", "flags")
+    _tid = 0x01
+    _fields = (("nick", "s"), ("games", "r"), ("flags", "B"))
+    _pool = []
+
+    def __init__(self, nick: str, games: bytes = b"", flags: int = 0):
         super().__init__()
         self.nick: str = nick
+        self.games: bytes = games  # con_id bitmap of the multiplayer games, see con_id_bitmap()
+        self.flags: int = flags  # BEACON_* state flags
+
+
+BEACON_BUSY = 0x01  # badge is in a connection, invites are declined
+
+
+def con_id_bitmap(con_ids) -> bytes:
+    # bit con_id % 8 of byte con_id // 8 is set for every con_id
+    bits = bytearray()
+    for con_id in con_ids:
+        n = con_id >> 3
+        if n >= len(bits):
+            bits.extend(bytes(n + 1 - len(bits)))
+        bits[n] |= 1 << (con_id & 7)
+    return bytes(bits)
 
 
 # Low level message that handle connection link
 @BadgeMsg.register
 class AckMsg(BadgeMsg):
+    __slots__ = ()
+    _tid = 0x02
+    _fields = ()
+    _pool = []
+
     def __init__(self, id: int=None):
         # super().__init__() no super init as this would advance msg_id
-        self.msg_type: str = type(self).__name__
-        self.__id = id
+        self._id = id
 
 
 # ask for connection
@@ -129,19 +214,71 @@ class AckMsg(BadgeMsg):
 # Low level message that handle connection link
 @BadgeMsg.register
 class OpenConn(BadgeMsg):
-    def __init__(self, con_id: int, accept: bool = True, session_id: int = None):
+    _tid = 0x03
+    _fields = (("con_id", "B"), ("accept", "?"), ("session_id", "I"), ("caps", "B"))
+
+    def __init__(
+        self, con_id: int, accept: bool = True, session_id: int = None, caps: int = 0
+    ):
         super().__init__()
         self.con_id: int = con_id  # if True  request, if False response
         self.accept: bool = accept  # when replying returns state will other connect
         self.session_id: int = session_id  # unique session ID to prevent cross-session message routing
+        self.caps: int = caps  # CAP_* features the sender supports on this connection
+
+
+CAP_DEFLATE = 0x01  # can inflate ZipMsg contents
 
 
 # Low level message that handle connection link
 @BadgeMsg.register
 class ConTerm(BadgeMsg):
-    def __init__(self, con_id: int):
+    _tid = 0x04
+    _fields = (("con_id", "B"), ("session_id", "I"))
+
+    def __init__(self, con_id: int, session_id: int = None):
         super().__init__()
         self.con_id: int = con_id
+        self.session_id: int = session_id  # session of the terminated connection
+
+
+# Selective ack of a Connection channel, see bdg.msg.channel
+@BadgeMsg.register
+class SackMsg(BadgeMsg):
+    __slots__ = ("con_id", "session_id", "cum", "sack", "credit")
+    _tid = 0x06
+    _pool = []
+    _fields = (
+        ("con_id", "B"),
+        ("session_id", "I"),
+        ("cum", "H"),
+        ("sack", "I"),
+        ("credit", "B"),
+    )
+
+    def __init__(
+        self, con_id: int, session_id: int, cum: int, sack: int = 0, credit: int = 0
+    ):
+        # no super init, acks do not need own msg_id
+        self._id = 0
+        self.con_id: int = con_id
+        self.session_id: int = session_id
+        self.cum: int = cum  # next seq receiver expects
+        self.sack: int = sack  # bit n: seq cum + 1 + n received
+        self.credit: int = credit  # messages after cum the receiver can take
+
+
+# Several core messages for the same peer sent as one frame, see
+# NowListener.queue_frame. Receiver handles them as if sent one by one.
+@BadgeMsg.register
+class BundleMsg(BadgeMsg):
+    _tid = 0x07
+    _fields = (("msgs", "M"),)
+
+    def __init__(self, msgs: list):
+        # no super init, bundles do not need own msg_id
+        self._id = 0
+        self.msgs: list = msgs
 
 
 # Application to application message header AppMsg contains a msg instance
@@ -154,13 +291,42 @@ class ConTerm(BadgeMsg):
 
 @BadgeMsg.register
 class AppMsg(BadgeMsg):
+    __slots__ = ("content", "con_id", "session_id", "seq", "ack", "sack", "credit")
+    _tid = 0x05
+    _pool = []
+    # ack, sack and credit piggyback the receive state of the channel, they
+    # must stay the last fields so Channel can restamp them into a serialized frame
+    _fields = (
+        ("content", "m"),
+        ("con_id", "B"),
+        ("session_id", "I"),
+        ("seq", "H"),
+        ("ack", "H"),
+        ("sack", "I"),
+        ("credit", "B"),
+    )
 
-    __msg_type_reg = {}
-
-    def __init__(self, content: object, con_id: int = 0, session_id: int = None):
+    # content types have their own registry and type id space
+    _msg_type_reg = {}
+    _tid_reg = {}
+
+    def __init__(
+        self,
+        content: object,
+        con_id: int = 0,
+        session_id: int = None,
+        seq: int = 0,
+        ack: int = 0,
+        sack: int = 0,
+        credit: int = 0,
+    ):
         super().__init__()
         self.con_id = con_id
         self.session_id = session_id  # session ID for message validation
+        self.seq = seq  # position in the Connection channel, see bdg.msg.channel
+        self.ack = ack  # piggybacked SackMsg.cum of the reverse direction
+        self.sack = sack  # piggybacked SackMsg.sack
+        self.credit = credit  # piggybacked SackMsg.credit
         if isinstance(content, BadgeMsg):
             self.content = content
         elif isinstance(content, dict):
@@ -170,25 +336,65 @@ class AppMsg(BadgeMsg):
             ctype, rest = content["msg_type"], {
                 k: v for k, v in content.items() if k != "msg_type"
             }
-            self.content: BadgeMsg = self.__msg_type_reg.get(ctype)(**rest)
+            self.content: BadgeMsg = self._msg_type_reg.get(ctype)(**rest)
+
+    def free(self):
+        # the content has its own owner by now, do not keep it alive
+        self.content = None
+        super().free()
 
 
 # most basic App msg that is handled by the connection stack
 @AppMsg.register
 class PingMsg(BadgeMsg):
-    def __init__(self, mark: float, reply):
+    __slots__ = ("mark", "reply")
+    _tid = 0x10
+    _fields = (("mark", "I"), ("reply", "?"))
+    _pool = []
+
+    def __init__(self, mark: int, reply):
         super().__init__()
-        self.mark: float = mark
+        self.mark: int = mark  # ticks_ms() of the sender
         self.reply: bool = reply
 
 
+# Piece of an AppMsg content too large for one frame, see bdg.msg.channel
+@AppMsg.register
+class FragMsg(BadgeMsg):
+    _tid = 0x14
+    _fields = (("total", "H"), ("off", "H"), ("data", "r"))
+
+    def __init__(self, total: int, off: int, data: bytes):
+        super().__init__()
+        self.total: int = total  # size of the serialized content
+        self.off: int = off  # position of data in it
+        self.data: bytes = data
+
+
+# Raw deflate compressed AppMsg content, see bdg.msg.channel
+@AppMsg.register
+class ZipMsg(BadgeMsg):
+    _tid = 0x15
+    _fields = (("data", "R"),)
+
+    def __init__(self, data: bytes):
+        super().__init__()
+        self.data: bytes = data
+
+
 # Now messages does not have to be defined in this file, it is enough to import
 # BadgeMsg and decorate all messages with @BadgeMsg.register.
+# Give each message a _tid that is unique within AppMsg contents (0x10-0x7f,
+# ids 0x80-0xff are derived from class name when _tid is missing) and a
+# _fields layout in __init__ argument order, see bdg.msg.codec.
 
 
 # Example of AppMsg
 @AppMsg.register
 class RPSMsg(BadgeMsg):
+    _tid = 0x11
+    _fields = (("choice", "b"),)
+
     def __init__(self, choice: int):
         super().__init__()
         self.choice: int = choice
@@ -197,12 +403,18 @@ class RPSMsg(BadgeMsg):
 @AppMsg.register
 class CancelActivityMsg(BadgeMsg):
     """Message sent when a badge exits from LoadingScreen or multiplayer game"""
+    _tid = 0x12
+    _fields = ()
+
     def __init__(self):
         super().__init__()
 
 
 @AppMsg.register
 class VictoryMsg(BadgeMsg):
+    _tid = 0x13
+    _fields = (("your", "h"), ("mine", "h"), ("tie", "?"), ("me_win", "?"))
+
     def __init__(self, your: int, mine: int, tie: bool = False, me_win: bool = False):
         super().__init__()
         self.your: int = your
@@ -225,8 +437,9 @@ async def send_message(espnow, mac: bytes, msg: bytes, sync=False, retries=3):
                 espnow.active(True)
                 gc.collect()
             elif err.args[1] == "ESP_ERR_ESPNOW_NOT_FOUND":
-                espnow.add_peer(mac)
-                gc.collect()
+                # peer was removed behind the back of the peer table
+                peers.forget(mac)
+                peers.ensure(mac)
             elif err.args[1] == "ESP_ERR_ESPNOW_IF":
                 import network
 
@@ -243,11 +456,45 @@ async def send_message(espnow, mac: bytes, msg: bytes, sync=False, retries=3):
 
 class BadgeAdr(object):
     # BadgeAdr is result in receivers end of receiving BeaconMsg
-    def __init__(self, mac: bytes, nick: str, rssi: int, last_seen: float):
+    __slots__ = (
+        "mac",
+        "nick",
+        "rssi",
+        "last_seen",
+        "games",
+        "flags",
+        "_prev",  # BadgeAdrDict recency list
+        "_next",
+    )
+
+    def __init__(
+        self,
+        mac: bytes,
+        nick: str,
+        rssi: int,
+        last_seen: float,
+        games: bytes = b"",
+        flags: int = 0,
+    ):
         self.mac: bytes = mac
         self.nick: bytes = nick
         self.rssi: int = rssi
         self.last_seen: float = last_seen
+        self.games: bytes = games  # BeaconMsg.games
+        self.flags: int = flags  # BeaconMsg.flags
+        self._prev = None
+        self._next = None
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.flags & BEACON_BUSY)
+
+    def supports(self, con_id: int) -> bool:
+        # badge has the multiplayer game con_id, True when it did not tell
+        if not self.games:
+            return True
+        n = con_id >> 3
+        return n < len(self.games) and bool(self.games[n] & (1 << (con_id & 7)))
 
     def __hash__(self):
         return hash(self.mac)
@@ -265,44 +512,123 @@ null_badge_adr = BadgeAdr(b"\x00\x00\x00\x00\x00\x00", b"[none]", -1, 0)
 
 
 class BadgeAdrDict:
-    # Dict like class for having fixed number of BadgeAdr instances with mac as key
+    """
+    Neighbour table, dict like with mac as key and BadgeAdr values.
+
+    Besides the dict the entries are chained into a doubly linked list in
+    the order they were last seen, oldest first, through the _prev/_next
+    slots of BadgeAdr. Inserting, touching and evicting the least recently
+    seen entry are O(1), and expiry only ever looks at the oldest entry.
+
+    Attributes:
+        max_size (int): Entries kept, the least recently seen one is evicted.
+        stale_multiplier (float): Badges not seen for stale_multiplier times
+            the beacon period are stale.
+    """
+
     def __init__(self, max_size, stale_multiplier=2.6):
         self.max_size = max_size
         self.stale_multiplier = stale_multiplier  # Multiplier for beacon timeout (e.g., 2.6 * beacon_timeout)
         self.store = {}
-        self.last_index = None
+        self.head = None  # least recently seen
+        self.tail = None  # most recently seen
+        self.stale_ms = None  # set by expire()
+        self.since = 0  # when stale_ms last changed, no badge is older than that
+        self.on_stale = None
+        self.on_evict = None  # called with the evicted BadgeAdr
+        self.timer = None  # expiry timer of the head on the wheel
+
+    def _link(self, badge):
+        # append as most recently seen
+        badge._prev = self.tail
+        badge._next = None
+        if self.tail is None:
+            self.head = badge
+        else:
+            self.tail._next = badge
+        self.tail = badge
+
+    def _unlink(self, badge):
+        if badge._prev is None:
+            self.head = badge._next
+        else:
+            badge._prev._next = badge._next
+        if badge._next is None:
+            self.tail = badge._prev
+        else:
+            badge._next._prev = badge._prev
+        badge._prev = badge._next = None
+
+    def _remove(self, key):
+        badge = self.store.pop(key)
+        self._unlink(badge)
+        return badge
 
     def _evict_if_necessary(self):
         if len(self.store) >= self.max_size:
-            # Find the key with the oldest last_seen value
-            oldest_key = min(self.store, key=lambda k: self.store[k].last_seen)
-            # Remove that key from the store
-            del self.store[oldest_key]
-    
+            badge = self._remove(self.head.mac)
+            if self.on_evict:
+                self.on_evict(badge)
+
     def cleanup_stale(self, beacon_timeout):
         """Remove badges that haven't been seen within stale_multiplier * beacon_timeout seconds.
         
         Args:
-            beacon_timeout: The beacon transmission interval in seconds
+            beacon_timeout: The beacon period in seconds, the beacon
+                interval is adaptive, see Beacon.period()
         
         Returns:
             Number of stale badges removed
         """
         stale_timeout = self.stale_multiplier * beacon_timeout
         current_time = time()
-        stale_keys = []
-        for key, badge in self.store.items():
-            if current_time - badge.last_seen > stale_timeout:
-                stale_keys.append(key)
-        
-        for key in stale_keys:
-            del self.store[key]
-        
-        # Update last_index if it was removed
-        if self.last_index not in self.store and self.store:
-            self.last_index = next(iter(self.store))
-        
-        return len(stale_keys)  # Return number of stale badges removed
+        removed = 0
+        while self.head and current_time - self.head.last_seen > stale_timeout:
+            self._remove(self.head.mac)
+            removed += 1
+        return removed
+
+    def expire(self, beacon_timeout, on_stale=None):
+        """Remove badges on a timer once not seen within
+        stale_multiplier * beacon_timeout seconds, instead of polling cleanup_stale.
+
+        Args:
+            beacon_timeout: The beacon period in seconds, see Beacon.period()
+            on_stale: Called with every removed BadgeAdr
+        """
+        self.on_stale = on_stale
+        self.stale_ms = 0
+        self.set_period(beacon_timeout)
+
+    def set_period(self, beacon_timeout):
+        # the beacon period changed, every badge gets a full new period from
+        # now, those seen under a longer one are not dropped right away
+        if self.stale_ms is None:
+            return  # expire() was not called, no expiry
+        self.stale_ms = int(self.stale_multiplier * beacon_timeout * 1000)
+        self.since = time()
+        wheel.cancel(self.timer)
+        self.timer = None
+        self._arm()
+
+    def _arm(self):
+        # one timer for the oldest entry, the others are younger
+        if self.timer is None and self.head is not None:
+            seen = max(self.head.last_seen, self.since)
+            left = self.stale_ms - int((time() - seen) * 1000)
+            self.timer = wheel.schedule(max(left, 0), self._expired)
+
+    def _expired(self):
+        # wheel callback, drops stale entries from the head and re-arms
+        self.timer = None
+        now = time()
+        while self.head:
+            if (now - max(self.head.last_seen, self.since)) * 1000 < self.stale_ms:
+                break
+            badge = self._remove(self.head.mac)
+            if self.on_stale:
+                self.on_stale(badge)
+        self._arm()
 
     def __setitem__(self, key, value):
         if not isinstance(value, BadgeAdr):
@@ -311,10 +637,15 @@ class BadgeAdrDict:
         if key != value.mac:
             raise ValueError("Key must match the 'mac' attribute of the value.")
 
-        self._evict_if_necessary()
+        if key in self.store:
+            self._remove(key)
+        else:
+            self._evict_if_necessary()
         self.store[key] = value
-        self.store[key].last_seen = time()
-        self.last_index = key
+        value.last_seen = time()
+        self._link(value)
+        if self.stale_ms:
+            self._arm()
 
     def __getitem__(self, key):
         if key in self.store:
@@ -323,7 +654,7 @@ class BadgeAdrDict:
 
     def __delitem__(self, key):
         if key in self.store:
-            del self.store[key]
+            self._remove(key)
         else:
             raise KeyError(f"Key {key} not found in store.")
 
@@ -348,22 +679,18 @@ class BadgeAdrDict:
         return self.store.keys()
 
     def latest(self):
-        # Handle case where last_index badge was removed (e.g., by cleanup_stale)
-        if self.last_index and self.last_index in self.store:
-            return self.store[self.last_index]
-        # Fallback: return any badge if store is not empty
-        if self.store:
-            self.last_index = next(iter(self.store))
-            return self.store[self.last_index]
-        # No badges available
-        return None
+        # most recently seen badge, None when the table is empty
+        return self.tail
 
     def update_last_seen(self, key, last_seen):
-        if key in self.store:
-            self.store[key].last_seen = last_seen
-            self.last_index = key
-            return True
-        return False
+        badge = self.store.get(key)
+        if badge is None:
+            return False
+        badge.last_seen = last_seen
+        if badge is not self.tail:
+            self._unlink(badge)
+            self._link(badge)
+        return True
 
 
 
@@ -384,4 +711,4 @@ def test():
     print(f"{b.srlz()=}")
     bb: VictoryMsg = BadgeMsg.desrlz(b.srlz())
     print(f"{bb.to_dict()=}")
-    print(f"{AppMsg.__registered_messages =} \n" f"{BadgeMsg.__registered_messages=} ")
+    print(f"{list(AppMsg._msg_type_reg)=} \n" f"{list(BadgeMsg._msg_type_reg)=} ")
@@ -0,0 +1,501 @@
+import asyncio
+import io
+import struct
+from time import ticks_ms, ticks_diff
+
+from bdg.msg import AppMsg, SackMsg, FragMsg, ZipMsg, MAX_FRAME, CAP_DEFLATE
+from bdg.msg.codec import SEQ_OFF
+from bdg.msg.timers import wheel
+from bdg.msg.tx import PRIO_CTRL
+
+try:
+    import deflate
+except ImportError:  # port built without deflate, contents go uncompressed
+    deflate = None
+
+# payload of one FragMsg so that its AppMsg frame is exactly MAX_FRAME
+FRAG_DATA = MAX_FRAME - len(AppMsg(FragMsg(0, 0, b"")).srlz())
+
+# features offered in OpenConn.caps
+LOCAL_CAPS = CAP_DEFLATE if deflate else 0
+ZIP_WBITS = 8  # 256 byte deflate window, keeps inflate memory small
+
+
+def zip_bytes(data) -> bytes:
+    out = io.BytesIO()
+    with deflate.DeflateIO(out, deflate.RAW, ZIP_WBITS) as d:
+        d.write(data)
+    return out.getvalue()
+
+
+def unzip_bytes(data, limit: int) -> bytes:
+    # raises ValueError when the result would be over limit bytes
+    out = deflate.DeflateIO(io.BytesIO(data), deflate.RAW, ZIP_WBITS).read(limit + 1)
+    if len(out) > limit:
+        raise ValueError("inflated content too large")
+    return out
+
+
+def seq_diff(a: int, b: int) -> int:
+    # signed distance a - b in 16 bit sequence space
+    return ((a - b + 0x8000) & 0xFFFF) - 0x8000
+
+
+class ReplayWindow:
+    """
+    Duplicate filter for the 16 bit message ids of one peer.
+
+    Remembers the highest id seen and a bitmap of the `width` ids below it,
+    so a check is a shift and a mask instead of a scan. Ids far outside the
+    window (peer restarted, reply echoing our own id) restart the window and
+    are accepted, retries always land inside it.
+    """
+
+    width = 30  # bitmap stays a small int on MicroPython
+
+    def __init__(self):
+        self.top = None
+        self.bits = 0  # bit n set when id top - n was seen
+
+    def check(self, seq: int) -> bool:
+        """Returns True when seq is new and marks it seen, False for a duplicate."""
+        d = seq_diff(seq, self.top) if self.top is not None else self.width
+        if d >= self.width or d <= -self.width:
+            self.top, self.bits = seq, 1
+        elif d > 0:
+            self.top = seq
+            self.bits = ((self.bits << d) | 1) & ((1 << self.width) - 1)
+        else:
+            bit = 1 << -d
+            if self.bits & bit:
+                return False
+            self.bits |= bit
+        return True
+
+
+class RttEstimator:
+    """
+    Smoothed round trip time of one peer as in RFC 6298, values in ms.
+
+    Fed from ack timing of frames that were sent only once (Karn) and from
+    PingMsg replies. rto drives the retransmission timers of Channel and
+    NowListener.send_msg, backoff() doubles it after a timeout until the
+    next sample arrives.
+    """
+
+    init_rto = 500
+    min_rto = 200
+    max_rto = 4000
+
+    def __init__(self):
+        self.srtt = None  # smoothed rtt, None until first sample
+        self.rttvar = 0  # rtt variation
+        self.rto = self.init_rto  # current retransmission timeout
+
+    def sample(self, rtt: int):
+        if rtt < 0:
+            return
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt // 2
+        else:
+            self.rttvar += (abs(self.srtt - rtt) - self.rttvar) // 4
+            self.srtt += (rtt - self.srtt) // 8
+        self.rto = min(
+            max(self.srtt + max(4 * self.rttvar, 10), self.min_rto), self.max_rto
+        )
+
+    def backoff(self):
+        self.rto = min(self.rto * 2, self.max_rto)
+
+    def __repr__(self):
+        return f"rtt({self.srtt}/{self.rttvar} rto={self.rto})"
+
+
+class Channel:
+    """
+    Sliding window reliable transport for the AppMsgs of one Connection.
+
+    Every AppMsg gets a 16 bit sequence number and up to `window` messages
+    are in flight at once. The receiver answers each data frame with a
+    SackMsg carrying the next sequence number it expects (cumulative ack)
+    and a bitmap of later messages it already holds (selective ack), so the
+    sender only retransmits what was really lost. Received messages are
+    handed to Connection.deliver strictly in sequence order.
+
+    Retransmission timeouts come from the peer RttEstimator (conn.rtt) and
+    are armed on the shared timer wheel, one timer per frame in flight.
+
+    Acks are delayed up to ack_delay_ms and every outgoing AppMsg carries the
+    current receive state in its ack/sack fields, so when both sides talk the
+    standalone SackMsg is skipped. Every second in order frame, gaps and
+    duplicates are acked right away.
+
+    Contents that do not fit one frame are split into FragMsg pieces, each
+    its own sequence number, so they are acked and retransmitted one by one.
+    The receiver reassembles them into one buffer of the announced size,
+    at most max_blob bytes, and drops it when pieces stop coming.
+
+    Every ack also carries a credit, the number of messages after the
+    cumulative ack the receiver can still take (free room of conn.in_q less
+    what it is already holding). The sender does not send past that edge;
+    while the credit is 0 it probes with one frame every persist interval,
+    and the receiver sends a fresh ack as soon as in_q has room again
+    (on_room). A probe the receiver has no room for is resent, but does not
+    count against max_retries. Messages that arrive while in_q is full are acked and held in
+    order instead of being dropped.
+
+    When the peer announced CAP_DEFLATE in OpenConn (zip is set), contents
+    over zip_min bytes are sent deflated in a ZipMsg if that makes them
+    smaller.
+
+    Attributes:
+        window (int): Max messages in flight, power of two, max 32.
+        max_retries (int): Retransmissions before the connection is terminated.
+        max_pending (int): Messages waiting for a free window slot.
+        ack_delay_ms (int): How long an ack may wait for an outgoing AppMsg.
+        max_blob (int): Largest content in bytes, split into FragMsgs.
+        reasm_timeout_ms (int): Partial content is dropped after this long.
+        zip_min (int): Smallest frame worth compressing.
+    """
+
+    window = 8
+    max_retries = 4
+    max_pending = 24
+    ack_delay_ms = 100
+    max_blob = 4096
+    reasm_timeout_ms = 10000
+    zip_min = 64
+
+    def __init__(self, conn, window=None):
+        self.conn = conn
+        if window:
+            if window & (window - 1) or window > 32:
+                raise ValueError("window must be a power of two <= 32")
+            self.window = window
+        self.mask = self.window - 1
+        self.zip = False  # peer can inflate, set from OpenConn.caps
+
+        # tx side, slots indexed by seq & mask
+        self.tx_next = 0  # seq of the next new message
+        self.tx_base = 0  # oldest unacked seq
+        self.pending = []  # serialized AppMsgs waiting for a window slot
+        self.frames = [None] * self.window  # serialized frame, None when acked
+        self.sent_ms = [0] * self.window
+        self.timers = [None] * self.window  # retransmission timer of the slot
+        self.tries = [0] * self.window
+        self.due = []  # seqs to (re)transmit
+        self.tx_limit = self.window  # seq the peer credit allows up to, excluded
+        self.persist_timer = None
+        self.persist_ms = 0  # probe interval while the peer credit is 0
+
+        # rx side
+        self.rx_next = 0  # next seq to deliver
+        self.rx_buf = [None] * self.window  # out of order contents
+        self.rx_unacked = 0  # frames received since our last ack
+        self.rx_credit = self.window  # credit of our last ack
+        self.held = []  # in order contents waiting for room in conn.in_q
+        self.ack_timer = None
+        self.reasm = None  # bytearray of the content being reassembled
+        self.reasm_timer = None
+
+    def send(self, amsg: AppMsg) -> bool:
+        """
+        Queues amsg, contents larger than one frame are sent as FragMsgs.
+
+        Returns:
+            bool: False when the message was dropped for lack of room.
+        """
+        frame = amsg.srlz()
+        if self.zip and len(frame) > self.zip_min:
+            body = amsg.content.srlz()
+            # the receiver inflates at most max_blob bytes
+            if len(body) > self.max_blob:
+                print(f"chan {self.conn.con_id}: {len(body)} bytes over max_blob")
+                return False
+            z = zip_bytes(body)
+            if len(z) + 3 < len(body):  # ZipMsg adds tid and length
+                amsg.content = ZipMsg(z)
+                frame = amsg.srlz()
+        if len(frame) <= MAX_FRAME:
+            frames = (frame,)
+        else:
+            body = amsg.content.srlz()
+            if len(body) > self.max_blob:
+                print(f"chan {self.conn.con_id}: {len(body)} bytes over max_blob")
+                return False
+            frames = [
+                AppMsg.pack(
+                    FragMsg(len(body), off, body[off : off + FRAG_DATA]),
+                    amsg.con_id,
+                    amsg.session_id,
+                )
+                for off in range(0, len(body), FRAG_DATA)
+            ]
+        if len(self.pending) + len(frames) > self.max_pending:
+            print(f"chan {self.conn.con_id}: tx backlog full, dropping {amsg}")
+            return False
+        for frame in frames:
+            self.pending.append(bytearray(frame))
+        self._pump()
+        return True
+
+    def close(self):
+        self.pending.clear()
+        self.due.clear()
+        for i in range(self.window):
+            wheel.cancel(self.timers[i])
+            self.timers[i] = None
+        wheel.cancel(self.persist_timer)
+        self.persist_timer = None
+        self.held.clear()
+        self._acked_rx()
+        self._drop_reasm()
+
+    def in_flight(self) -> int:
+        return seq_diff(self.tx_next, self.tx_base)
+
+
+    def _blocked(self) -> bool:
+        # peer credit does not cover the next seq
+        return seq_diff(self.tx_limit, self.tx_next) <= 0
+
+    def _fill(self):
+        # move pending messages into free window slots the peer has credit for
+        while self.pending and self.in_flight() < self.window and not self._blocked():
+            frame = self.pending.pop(0)
+            # seq is in the frame header, ack, sack and credit are the last AppMsg fields
+            struct.pack_into("<H", frame, SEQ_OFF, self.tx_next)
+            i = self.tx_next & self.mask
+            self.frames[i] = frame
+            self.tries[i] = 0
+            self.due.append(self.tx_next)
+            self.tx_next = (self.tx_next + 1) & 0xFFFF
+
+    def _timeout(self, seq):
+        # wheel callback, frame seq was not acked within rto
+        i = seq & self.mask
+        self.timers[i] = None
+        if self.frames[i] is None or self.conn.closed:
+            return
+        if seq == self.tx_base:
+            self.conn.rtt.backoff()
+        self.due.append(seq)
+        self._pump()
+
+    def _probe(self):
+        # wheel callback, peer credit stayed 0, let one more frame out
+        self.persist_timer = None
+        if self.pending and self._blocked() and not self.conn.closed:
+            self.tx_limit = (self.tx_next + 1) & 0xFFFF
+            self.persist_ms = min(self.persist_ms * 2, self.conn.rtt.max_rto)
+            self._pump()
+
+    def _pump(self):
+        # queues new and timed out frames on tx, nothing here has to wait
+        conn = self.conn
+        while not conn.closed:
+            self._fill()
+            if not self.due:
+                return
+            seq = self.due.pop(0)
+            i = seq & self.mask
+            if self.frames[i] is None:
+                continue  # acked meanwhile
+            if self.tries[i] and seq_diff(seq, self.tx_limit) >= 0:
+                # probe still past the peer credit, refused for lack of room
+                # and not lost. Counts as sent twice from here, no rtt sample
+                # (Karn) and max_retries applies once the credit covers it
+                self.tries[i] = 1
+            elif self.tries[i] > self.max_retries:
+                print(f"chan {conn.con_id}: seq {seq} not acked, closing")
+                self.close()
+                asyncio.create_task(conn.terminate())
+                return
+            if self.tries[i]:
+                print(f"<<{'r' * self.tries[i]} seq {seq} {conn.rtt}")
+            self.tries[i] += 1
+            self.sent_ms[i] = ticks_ms()
+            self.timers[i] = wheel.schedule(conn.rtt.rto, self._timeout, seq)
+            frame = self.frames[i]
+            # piggyback current receive state, the last AppMsg fields
+            credit = self.credit()
+            struct.pack_into(
+                "<HIB", frame, len(frame) - 7, self.rx_next, self.sack(), credit
+            )
+            self._acked_rx(credit)
+            conn.send_frame(frame)
+
+    def on_ack(self, cum: int, sack: int, credit: int):
+        """
+        Handles a SackMsg from the peer.
+
+        Args:
+            cum: Next seq the peer expects, everything before it is received.
+            sack: Bit n set when seq cum + 1 + n is received.
+            credit: Messages after cum the peer can take.
+        """
+        if seq_diff(cum, self.tx_base) < 0 or seq_diff(self.tx_next, cum) < 0:
+            return  # stale or bogus ack
+        self.tx_limit = (cum + credit) & 0xFFFF
+        now = ticks_ms()
+        rtt = -1
+        while self.tx_base != cum:
+            rtt = self._acked(self.tx_base & self.mask, now, rtt)
+            self.tx_base = (self.tx_base + 1) & 0xFFFF
+        seq = (cum + 1) & 0xFFFF
+        while sack and seq != self.tx_next:
+            if sack & 1:
+                rtt = self._acked(seq & self.mask, now, rtt)
+            sack >>= 1
+            seq = (seq + 1) & 0xFFFF
+        if rtt >= 0:
+            self.conn.rtt.sample(rtt)
+        if not self.pending:
+            return
+        if not self._blocked():
+            wheel.cancel(self.persist_timer)
+            self.persist_timer = None
+            self.persist_ms = 0
+            self._pump()
+        elif self.persist_timer is None and not self.in_flight():
+            # nothing in flight would bring a new credit, probe
+            self.persist_ms = self.persist_ms or self.conn.rtt.rto
+            self.persist_timer = wheel.schedule(self.persist_ms, self._probe)
+
+    def _acked(self, i, now, rtt):
+        # releases slot i, returns rtt sample if frame was sent only once (Karn)
+        if self.frames[i] is not None:
+            self.frames[i] = None
+            wheel.cancel(self.timers[i])
+            self.timers[i] = None
+            if self.tries[i] == 1:
+                return ticks_diff(now, self.sent_ms[i])
+        return rtt
+
+    def sack(self) -> int:
+        bits = 0
+        for n in range(self.window - 1):
+            if self.rx_buf[(self.rx_next + 1 + n) & self.mask] is not None:
+                bits |= 1 << n
+        return bits
+
+    def credit(self) -> int:
+        return max(0, min(self.conn.rx_room() - len(self.held), self.window))
+
+    def _acked_rx(self, credit=None):
+        # receive state went out, drop the delayed ack
+        if credit is not None:
+            self.rx_credit = credit
+        self.rx_unacked = 0
+        wheel.cancel(self.ack_timer)
+        self.ack_timer = None
+
+    def _ack_frame(self) -> bytes:
+        conn = self.conn
+        credit = self.credit()
+        self._acked_rx(credit)
+        return SackMsg.pack(
+            conn.con_id, conn.session_id, self.rx_next, self.sack(), credit
+        )
+
+    def _ack_due(self):
+        # wheel callback, nothing to piggyback on within ack_delay_ms
+        self.ack_timer = None
+        if self.rx_unacked and not self.conn.closed:
+            self.conn.send_frame(self._ack_frame(), PRIO_CTRL)
+
+    def on_room(self):
+        """
+        Called by the connection when the app took a message from in_q:
+        delivers held contents and reopens a closed credit right away.
+        """
+        if self.conn.closed:
+            return
+        while self.held:
+            if self.conn.deliver(self.held[0]) is False:
+                return
+            self.held.pop(0)
+        if not self.rx_credit and self.credit():
+            self.conn.send_frame(self._ack_frame(), PRIO_CTRL)
+
+    def _deliver(self, content):
+        # in order delivery, held back while in_q is full
+        if self.held or self.conn.deliver(content) is False:
+            self.held.append(content)
+
+    def _drop_reasm(self, *_):
+        # also wheel callback, pieces stopped coming
+        wheel.cancel(self.reasm_timer)
+        self.reasm = self.reasm_timer = None
+
+    def _reassemble(self, frag: FragMsg):
+        # returns the content once its last piece is in, pieces come in order
+        if frag.off == 0:
+            self._drop_reasm()
+            if frag.total > self.max_blob:
+                print(f"chan {self.conn.con_id}: {frag.total} bytes over max_blob")
+                return None
+            self.reasm = bytearray(frag.total)
+        elif self.reasm is None or len(self.reasm) != frag.total:
+            return None  # rest of a dropped content
+        end = frag.off + len(frag.data)
+        if end > frag.total:
+            self._drop_reasm()
+            return None
+        self.reasm[frag.off : end] = frag.data
+        wheel.cancel(self.reasm_timer)
+        if end < frag.total:
+            self.reasm_timer = wheel.schedule(self.reasm_timeout_ms, self._drop_reasm)
+            return None
+        buf = self.reasm
+        self._drop_reasm()
+        return self._content(buf)
+
+    def _content(self, buf):
+        ctor = AppMsg._tid_reg.get(buf[0]) if buf else None
+        if ctor is None:
+            return None
+        content, _ = ctor._layout.loads(buf)
+        return content
+
+    def _unzip(self, zmsg: ZipMsg):
+        if deflate is None:
+            print(f"chan {self.conn.con_id}: got ZipMsg without deflate support")
+            return None
+        return self._content(unzip_bytes(zmsg.data, self.max_blob))
+
+    async def on_data(self, amsg: AppMsg):
+        """
+        Handles a sequenced AppMsg from the peer: takes its piggybacked ack,
+        delivers everything that is now in order and acks the receive state,
+        delayed when the frame was in order.
+        """
+        self.on_ack(amsg.ack, amsg.sack, amsg.credit)
+        d = seq_diff(amsg.seq, self.rx_next)
+        if 0 < d < self.window:
+            # out of order, hold until the gap is filled
+            self.rx_buf[amsg.seq & self.mask] = amsg.content
+        elif d == 0 and len(self.held) < self.window:
+            content = amsg.content
+            while content is not None:
+                self.rx_buf[self.rx_next & self.mask] = None
+                self.rx_next = (self.rx_next + 1) & 0xFFFF
+                try:
+                    if isinstance(content, FragMsg):
+                        content = self._reassemble(content)
+                    if isinstance(content, ZipMsg):
+                        content = self._unzip(content)
+                    if content is not None:
+                        self._deliver(content)
+                except Exception as e:
+                    print(f"chan {self.conn.con_id}: deliver failed {e}")
+                content = self.rx_buf[self.rx_next & self.mask]
+        # d < 0 is a duplicate and d >= window is beyond the window, only ack,
+        # so is an in order frame while too much is held (peer ignored credit)
+
+        self.rx_unacked += 1
+        if d or self.rx_unacked >= 2:
+            self.conn.send_frame(self._ack_frame(), PRIO_CTRL)
+        elif self.ack_timer is None:
+            self.ack_timer = wheel.schedule(self.ack_delay_ms, self._ack_due)
@@ -0,0 +1,237 @@
+"""
+Binary wire format for badge messages.
+
+Every message class registered with ``@BadgeMsg.register`` or
+``@AppMsg.register`` gets a one byte type id (``_tid``) and a field layout
+(``_fields``), a tuple of ``(name, code)`` pairs in ``__init__`` argument
+order. The layout is compiled once at registration time into a ``Layout``
+that packs and unpacks the message with ``struct``, no intermediate dicts.
+
+Field codes are ``struct`` format characters (b B h H i I f ...) and:
+    "?"  bool, packed as one byte
+    "s"  utf-8 string, one byte length prefix (max 255 bytes)
+    "o"  any msgpack-able value, one byte length prefix
+    "r"  raw bytes, one byte length prefix
+    "R"  raw bytes, two byte length prefix, for contents sent in FragMsgs
+    "m"  nested message from the owning class registry (AppMsg content)
+    "M"  nested messages up to the end of the frame (BundleMsg), packs a
+         list of messages or already serialized frames
+
+A frame is the fixed header followed by the body. Core messages
+(BadgeMsg.register) have the versioned header
+
+    magic:u8 version:u8 tid:u8 con_id:u8 seq:u16 id:u16
+
+so a receiver can drop frames of other ESP-NOW devices, older firmware or
+connections it does not serve by looking at a few bytes, see frame_tid().
+A ("con_id", "B") or ("seq", "H") entry of ``_fields`` is stored in the
+header instead of the body, classes without them send 0. AppMsg contents
+have only ``tid:u8``. Classes without ``_fields`` fall back to a length
+prefixed msgpack dict body, so old style messages keep working.
+"""
+
+import struct
+
+import umsgpack
+
+MAGIC = 0xBD
+VERSION = 1  # bump on incompatible wire format changes
+CORE_HEAD = "<BBBBHH"  # magic, version, tid, con_id, seq, msg id
+CONTENT_HEAD = "<B"  # tid
+HEAD_SIZE = struct.calcsize(CORE_HEAD)
+CON_ID_OFF = 3  # offsets of the header fields in a core frame
+SEQ_OFF = 4
+
+# fields moved from the body into the core header and their header index
+_HEAD_FIELDS = {("con_id", "B"): 3, ("seq", "H"): 4}
+
+_VAR_CODES = "sorRmM"
+
+
+def name_tid(name: str) -> int:
+    # Stable type id for classes that do not declare _tid, upper half of
+    # the id space is reserved for these
+    h = 0
+    for c in name.encode():
+        h = (h * 31 + c) & 0x7F
+    return 0x80 | h
+
+
+def frame_tid(buf, end: int, off: int = 0):
+    """
+    Type id of the core message frame in buf[off:end], None if it does not
+    start with a header of this version. Reads single bytes only, so junk
+    can be dropped before anything is allocated.
+    """
+    if end - off < HEAD_SIZE or buf[off] != MAGIC or buf[off + 1] != VERSION:
+        return None
+    return buf[off + 2]
+
+
+def frame_seq(buf) -> int:
+    # seq of a core frame that passed frame_tid()
+    return buf[SEQ_OFF] | buf[SEQ_OFF + 1] << 8
+
+
+def _pack_var(code, v):
+    if code == "m":
+        return v.srlz()
+    if code == "M":
+        return b"".join(m if isinstance(m, (bytes, bytearray)) else m.srlz() for m in v)
+    if code == "R":
+        b = v or b""
+        return struct.pack("<H", len(b)) + b
+    if code == "s":
+        b = (v or "").encode()[:255]
+    elif code == "r":
+        b = v or b""
+        if len(b) > 255:
+            raise ValueError(f"field too long {len(b)}")
+    else:
+        b = umsgpack.dumps(v)
+        if len(b) > 255:
+            raise ValueError(f"field too long {len(b)}")
+    return bytes((len(b),)) + b
+
+
+class Layout:
+    """Compiled struct layout of one message class"""
+
+    def __init__(self, cls, head: str, fields, nested=None):
+        self.cls = cls
+        self.nested = nested  # tid registry for "m" fields
+        self.core = head == CORE_HEAD
+        self.nhead = len(head) - 1
+        self.kw = fields is None  # no layout, msgpack dict body
+        # (argument index, header index) of the fields kept in the header
+        self.lift = []
+        if self.core and fields:
+            body = []
+            for name, code in fields:
+                h = _HEAD_FIELDS.get((name, code))
+                if h is None:
+                    body.append((name, code))
+                else:
+                    self.lift.append((len(body) + len(self.lift), h))
+            fields = body
+        # steps: (fmt, size, names, bools) for fixed runs of struct codes,
+        # (code, 0, name, None) for variable length fields
+        self.steps = []
+        fmt, names, bools = head, [], []
+        for name, code in fields or ():
+            if code in _VAR_CODES:
+                if fmt != "<":
+                    self._add_run(fmt, names, bools)
+                self.steps.append((code, 0, name, None))
+                fmt, names, bools = "<", [], []
+            else:
+                if code == "?":
+                    bools.append(len(fmt) - 1)
+                    code = "B"
+                fmt += code
+                names.append(name)
+        if fmt != "<" or not self.steps:
+            self._add_run(fmt, names, bools)
+        if self.kw:
+            self.steps.append(("o", 0, None, None))
+        self.fixed = len(self.steps) == 1
+
+    def _add_run(self, fmt, names, bools):
+        self.steps.append((fmt, struct.calcsize(fmt), tuple(names), tuple(bools)))
+
+    def dumps(self, msg) -> bytes:
+        if self.core:
+            vals = [MAGIC, VERSION, self.cls._tid, 0, 0, msg.id]
+            for i, h in self.lift:
+                v = getattr(msg, self.cls._fields[i][0])
+                vals[h] = 0 if v is None else v
+        else:
+            vals = [self.cls._tid]
+        parts = []
+        for fmt, size, names, _ in self.steps:
+            if size:
+                for n in names:
+                    v = getattr(msg, n)
+                    vals.append(0 if v is None else v)
+                parts.append(struct.pack(fmt, *vals))
+                vals = []
+            elif names is None:
+                parts.append(_pack_var(fmt, msg.fields()))
+            else:
+                parts.append(_pack_var(fmt, getattr(msg, names)))
+        return parts[0] if self.fixed else b"".join(parts)
+
+    def loads(self, buf, off=0, end=None):
+        """
+        Decode one message from buf[off:end], buf can be a memoryview.
+
+        Returns:
+            (msg, off): decoded message and offset of the first byte after it
+
+        Raises:
+            ValueError, IndexError: on truncated or malformed input
+        """
+        if end is None:
+            end = len(buf)
+        vals = []
+        for fmt, size, names, bools in self.steps:
+            if size:
+                if off + size > end:
+                    raise ValueError("truncated frame")
+                t = struct.unpack_from(fmt, buf, off)
+                off += size
+                if bools:
+                    t = list(t)
+                    for i in bools:
+                        t[i] = bool(t[i])
+                vals.extend(t)
+            elif fmt == "M":
+                msgs = []
+                while off < end:
+                    tid = frame_tid(buf, end, off)
+                    if tid is None:
+                        raise ValueError("bad bundled header")
+                    ctor = self.nested.get(tid)
+                    if ctor is None:
+                        raise ValueError(f"unknown bundled type {tid}")
+                    v, off = ctor._layout.loads(buf, off, end)
+                    msgs.append(v)
+                vals.append(msgs)
+            elif off >= end:
+                raise ValueError("truncated field")
+            elif fmt == "R":
+                n = off + 2
+                if n <= end:
+                    n += struct.unpack_from("<H", buf, off)[0]
+                if n > end:
+                    raise ValueError("truncated field")
+                vals.append(bytes(buf[off + 2 : n]))
+                off = n
+            elif fmt == "m":
+                ctor = self.nested.get(buf[off])
+                if ctor is None:
+                    raise ValueError(f"unknown content type {buf[off]}")
+                v, off = ctor._layout.loads(buf, off, end)
+                vals.append(v)
+            else:
+                n = off + 1 + buf[off]
+                if n > end:
+                    raise ValueError("truncated field")
+                if fmt == "s":
+                    vals.append(str(buf[off + 1 : n], "utf-8"))
+                elif fmt == "r":
+                    vals.append(bytes(buf[off + 1 : n]))
+                else:
+                    vals.append(umsgpack.loads(bytes(buf[off + 1 : n])))
+                off = n
+
+        if self.kw:
+            msg = self.cls(**vals.pop())
+        else:
+            args = vals[self.nhead :]
+            for i, h in self.lift:
+                args.insert(i, vals[h])
+            msg = self.cls.take(*args)
+        if self.core:
+            msg._id = vals[5]
+        return msg, off
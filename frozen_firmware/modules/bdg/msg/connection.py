@@ -1,12 +1,12 @@
 import asyncio
+import random
 from time import ticks_ms, ticks_diff, time
 
 import aioespnow
-from collections import namedtuple, deque
+from collections import namedtuple
 
 from bdg.msg import (
     OpenConn,
-    send_message,
     ConTerm,
     PingMsg,
     AppMsg,
@@ -14,15 +14,51 @@ from bdg.msg import (
     BeaconMsg,
     BadgeAdr,
     BadgeAdrDict,
+    BEACON_BUSY,
+    con_id_bitmap,
     AckMsg,
+    SackMsg,
+    BundleMsg,
+    MAX_FRAME,
+    CAP_DEFLATE,
 )
+from bdg.msg.channel import Channel, ReplayWindow, RttEstimator, LOCAL_CAPS
+from bdg.msg.codec import CON_ID_OFF, frame_tid
+from bdg.msg.peers import peers
+from bdg.msg.timers import wheel
+from bdg.msg.tx import tx, PRIO_CTRL, PRIO_DATA, PRIO_BEACON
+from bdg.msg.updates import UpdateBroker, BADGE_ADDED, BADGE_REMOVED, BADGE_UPDATED
 
 from bdg.utils import AProc
 from primitives import Queue
 
 
 OutQueMsg = namedtuple("OutQueMsg", ["msg", "mac", "id", "retry"])
-OutQueAck = namedtuple("OutQueMsg", ["mac", "id"])
+
+
+class InQueue(Queue):
+    # Connection.in_q, reports every message the app takes so the channel
+    # can hand over held messages and give the peer credit again
+    def __init__(self, maxsize, on_get):
+        super().__init__(maxsize)
+        self.on_get = on_get
+
+    async def get(self):
+        msg = await super().get()
+        self.on_get()
+        return msg
+
+    def get_nowait(self):
+        msg = super().get_nowait()
+        self.on_get()
+        return msg
+
+    def put_last(self, msg):
+        # queues the final message of a closing connection, it must get
+        # through, so the oldest unread message makes room when full
+        if self.full():
+            super().get_nowait()
+        self.put_nowait(msg)
 
 
 class Connection(object):
@@ -35,7 +71,9 @@ class Connection(object):
         active (bool): Status of whether the connection is active or not.
         last_msg (timestamp): Timestamp of the last message received.
         con_id: Unique identifier for the app that uses this connection. Like content-type
-        in_q (Queue): Queue to store incoming messages.
+        in_q (InQueue): Queue to store incoming messages, its free room is the credit of the peer.
+        channel (Channel): Sliding window transport carrying the AppMsgs.
+        rtt (RttEstimator): Round trip estimate of the peer, also as srtt, rttvar and rto.
 
     Methods:
         async connect(self, rcvr=False):
@@ -50,23 +88,34 @@ class Connection(object):
         async recv_msg(self, msg: BadgeMsg):
             Handles the reception of messages internally and processes different types of messages. Called by NowListener.
 
+        deliver(self, msg: BadgeMsg):
+            Takes an in order content from the channel, False when in_q is full.
+
         async send_app_msg(self, msg: BadgeMsg, sync=False):
             Sends an application message over the connection. Receiving end gets the same class as the sender sent.
 
         async send_msg_b(self, msg: bytes, sync=False):
             Sends a byte message over the connection.
 
+        send_frame(self, frame: bytes, prio=PRIO_DATA):
+            Queues a serialized core message to the peer, bundled with others when possible.
+
         async send_wait_reply(self, msg: bytes, sync=False, timeout=5.0):
             Sends a message and waits for a reply within a timeout period. Raises TimeoutError if timeout exceeded.
 
         get_msg_aiter(self):
             Returns an asynchronous iterator to iterate over incoming messages.
+
+        async recv(self, msg_cls, timeout=None):
+            Waits for the next message of type msg_cls, None if the connection closed.
+
+        on(self, msg_cls, cb):
+            Calls cb(msg) for every incoming msg_cls instead of queueing it.
     """
 
     # Connection is a bidirectional communication channel between two badges
     #
-    def __init__(self, mac: bytes, con_id, espnow):
-        self._sender_t: asyncio.Task = None
+    def __init__(self, mac: bytes, con_id, espnow, window=None, session_id=None):
         self.espnow: espnow = espnow
         self.c_mac: bytes = mac
         # self.call_chnl = 1
@@ -75,30 +124,82 @@ class Connection(object):
         self.closed = False
         self.last_msg = time()
         self.con_id = con_id
-        self.session_id = ticks_ms()  # unique session ID to prevent cross-session messages
-        self.in_q = Queue(maxsize=5)
-        self.out_q = Queue(maxsize=3)
+        # unique session ID to prevent cross-session messages, the accepting
+        # side takes the session of the incoming OpenConn
+        self.session_id = session_id or ticks_ms()
+        self.in_q = InQueue(5, self._room_freed)
+        self.waiters = {}  # content _tid -> [[Event, msg], ...] of recv() calls
+        self.callbacks = {}  # content _tid -> cb(msg), see on()
+        self.rtt = NowListener.rtt_for(mac)
+        self.channel = Channel(self, window=window)
 
         NowListener.register_con(self)
 
+    @property
+    def key(self):
+        # index of the connection in NowListener.connections
+        return (self.c_mac, self.con_id, self.session_id)
+
+    def set_session(self, session_id):
+        """
+        Adopts the session_id of the peer, re-keying the registered connection.
+        """
+        if not session_id or session_id == self.session_id:
+            return
+        registered = NowListener.unregister_con(self)
+        self.session_id = session_id
+        if registered:
+            NowListener.register_con(self)
+
     def __del__(self):
         print("conn closed")
 
+    def peer_caps(self, caps):
+        # features the peer announced in OpenConn, used when we support them too
+        self.channel.zip = bool(caps & CAP_DEFLATE & LOCAL_CAPS)
+
+    def send_frame(self, frame, prio=PRIO_DATA):
+        # serialized core message to the peer, may be bundled with others
+        NowListener.queue_frame(self.c_mac, frame, prio)
+
+    @property
+    def srtt(self):
+        return self.rtt.srtt
+
+    @property
+    def rttvar(self):
+        return self.rtt.rttvar
+
+    @property
+    def rto(self):
+        return self.rtt.rto
+
     async def terminate(self, send_out=True, reply_to_id=None):
-        # send connection terminated to local listeners
-        ct = ConTerm(con_id=self.con_id)
-        self.in_q.put_nowait(ct)
+        if self.closed:
+            return
+        ct = ConTerm(con_id=self.con_id, session_id=self.session_id)
         if send_out:
             if reply_to_id:
-                ct.__id = reply_to_id
+                ct._id = reply_to_id
             self.send_msg(ct)
-            NowListener.unregister_con(self)
+        # closed connections must not stay registered, they are keyed by
+        # session and nothing else would ever replace them
+        NowListener.unregister_con(self)
         self.active = False
         self.closed = True
+        # send connection terminated to local listeners, nothing is queued after it
+        self.in_q.put_last(ct)
+        NowListener.update_busy()
+        self.channel.close()
+        # release recv() waiters with None
+        for waiting in self.waiters.values():
+            for w in waiting:
+                w[0].set()
+        self.waiters.clear()
 
     async def connect(self, rcvr=False):
         try:
-            oc = OpenConn(con_id=self.con_id, session_id=self.session_id)
+            oc = OpenConn(con_id=self.con_id, session_id=self.session_id, caps=LOCAL_CAPS)
             if rcvr:
                 self.send_msg(oc)
                 self.active = True
@@ -111,10 +212,11 @@ class Connection(object):
                 or reply.con_id != self.con_id
             ):
                 # print(f'not accepted reply: {type(reply)} {reply=}')
-                return await self.terminate(False)
+                await self.terminate(False)
+                return False
             # Store peer's session_id from their reply
-            if hasattr(reply, 'session_id') and reply.session_id:
-                self.session_id = reply.session_id
+            self.set_session(reply.session_id)
+            self.peer_caps(reply.caps)
             # connection made
             self.active = True
             return True
@@ -123,31 +225,39 @@ class Connection(object):
             return False
         except Exception as err:
             print(f"conn err {err}")
+            NowListener.unregister_con(self)
             return False
 
     async def ping(self):
         print(f"ping: ")
         mark = ticks_ms()
-        self.send_app_msg(PingMsg(mark, False), sync=False)
+        ping = PingMsg.take(mark, False)
+        self.send_app_msg(ping, sync=False)
+        ping.free()
         reply = await asyncio.wait_for(self.in_q.get(), 5)
-        print(f"ping reply: {ticks_diff(ticks_ms(), mark)}ms {reply=}")
+        print(f"ping reply: {ticks_diff(ticks_ms(), mark)}ms {self.rtt} {reply=}")
         return reply
 
-    async def _sender(self):
-        # sender task to decouple sync calls to async.
-        # micro gui callbacks are sync so this is needed
-        # if in async context self.send_app_msg can be called directly
-        if not self.active:
-            print(f"cannot send con {self.con_id} terminated")
-            return  # cannot send on closed connection
-        while self.out_q.qsize() > 0 or self.active:
-            msg = await asyncio.wait_for(self.out_q.get(), 5000)
-            print(f"_s:  {msg}")
-            self.send_app_msg(msg, sync=False)
+    def rx_room(self) -> int:
+        # free in_q slots, advertised to the peer as channel credit
+        return self.in_q.maxsize - self.in_q.qsize()
+
+    def _room_freed(self):
+        if not self.closed:
+            self.channel.on_room()
 
     async def recv_msg(self, msg: BadgeMsg):
-        # internal recv_msg that is called from NowListener
+        # internal recv_msg that is called from NowListener and the channel,
+        # returns False when in_q is full and msg was not taken
         print(f"recv-msg {msg=}")
+        if self.closed:
+            return
+        if isinstance(msg, (ConTerm, OpenConn)):
+            await self._recv_ctrl(msg)
+        else:
+            return self.deliver(msg)
+
+    async def _recv_ctrl(self, msg: BadgeMsg):
         if isinstance(msg, ConTerm):
             if self.active:
                 await self.terminate(send_out=False)
@@ -155,30 +265,100 @@ class Connection(object):
         elif isinstance(msg, OpenConn):
             if not self.active:
                 # Store peer's session_id from their OpenConn
-                if hasattr(msg, 'session_id') and msg.session_id:
-                    self.session_id = msg.session_id
+                self.set_session(msg.session_id)
                 self.in_q.put_nowait(msg)
                 self.active = True
                 print(f"connection {self.con_id} activated, session_id={self.session_id}")
             # self.send_msg(AckMsg(id=msg.id), retry=0)
-        elif isinstance(msg, PingMsg):
+
+    def deliver(self, msg: BadgeMsg):
+        # content from the channel in sequence order, returns False when
+        # in_q is full and msg was not taken
+        if self.closed:
+            return
+        if isinstance(msg, PingMsg):
             if msg.reply:
-                self.in_q.put_nowait(msg)
+                self.rtt.sample(ticks_diff(ticks_ms(), msg.mark))
+                if not self.in_q.full():
+                    self.in_q.put_nowait(msg)
                 return
             msg.reply = True
             self.send_app_msg(msg)
+            msg.free()
         elif not self.active:
             print("connection not active")
-        else:
-            # this can block, should check quefull and return something to client B
+        elif not self._route(msg):
+            if self.in_q.full():
+                # channel holds it and withholds credit until the app catches up
+                return False
             self.in_q.put_nowait(msg)
 
+    def _route(self, msg: BadgeMsg) -> bool:
+        # hands msg to a recv() waiter or an on() callback, True when consumed
+        waiting = self.waiters.get(msg._tid)
+        if waiting:
+            w = waiting.pop(0)
+            w[1] = msg
+            w[0].set()
+            return True
+        cb = self.callbacks.get(msg._tid)
+        if cb is None:
+            return False
+        res = cb(msg)
+        if hasattr(res, "send"):  # coroutine function callback, other results are ignored
+            asyncio.create_task(res)
+        return True
+
+    def on(self, msg_cls, cb):
+        """
+        Calls cb(msg) for every incoming msg_cls content instead of queueing
+        it to in_q. cb can be a plain function, whose return value is ignored,
+        or a coroutine function, run as a task. None removes it.
+        """
+        if cb is None:
+            self.callbacks.pop(msg_cls._tid, None)
+        else:
+            self.callbacks[msg_cls._tid] = cb
+
+    async def recv(self, msg_cls, timeout=None):
+        """
+        Waits for the next incoming msg_cls content, other contents go on to
+        callbacks and in_q as usual.
+
+        Returns:
+            msg_cls instance, None if the connection closed meanwhile
+
+        Raises:
+            asyncio.TimeoutError: nothing arrived within timeout seconds
+        """
+        if self.closed:
+            return None
+        w = [asyncio.Event(), None]
+        waiting = self.waiters.get(msg_cls._tid)
+        if waiting is None:
+            waiting = self.waiters[msg_cls._tid] = []
+        waiting.append(w)
+        try:
+            if timeout is None:
+                await w[0].wait()
+            else:
+                await asyncio.wait_for(w[0].wait(), timeout)
+        finally:
+            for n, x in enumerate(waiting):
+                if x is w:
+                    del waiting[n]
+                    break
+        return w[1]
+
     def send_app_msg(self, msg: BadgeMsg, sync=False):
-        amsg = AppMsg(con_id=self.con_id, content=msg, session_id=self.session_id)
+        # contents up to Channel.max_blob bytes, larger than a frame are fragmented
         if self.closed:
             print(f"cannot send {self.con_id=} is terminated")
-            return  # cannot send on closed connection
-        NowListener.send_msg(amsg, self.c_mac, sync=sync)
+            return False  # cannot send on closed connection
+        amsg = AppMsg.take(msg, self.con_id, self.session_id)
+        sent = self.channel.send(amsg)
+        amsg.free()
+        return sent
 
     def send_msg(self, msg: BadgeMsg, sync=False, retry=3):
         if self.closed:
@@ -225,12 +405,154 @@ async def def_con_cb(con: Connection, req=False):
     return True
 
 
-def wait_index(msg):
-    return msg.mac + bytes([msg.id])
+class RxLimiter:
+    """
+    Per sender admission control in front of rx_ring.
 
+    Every mac gets a token bucket of `burst` frames refilled at `rate`
+    frames per second, a frame that finds no token is dropped before it is
+    copied or decoded, so a flooding peer costs a dict lookup per frame.
 
-def wait_index_mac(mac, msg_id):
-    return mac + bytes([msg_id])
+    At most max_peers buckets are kept, buckets that refilled completely are
+    dropped by a sweep every sweep_ms. Senders that find the table full
+    share a count-min sketch instead, which lets each of them through
+    rate * sweep_ms / 1000 times per sweep window.
+
+    Attributes:
+        rate (int): Sustained frames per second per mac.
+        burst (int): Frames a mac may send back to back.
+        max_peers (int): Token buckets kept.
+        sweep_ms (int): Interval of idle bucket removal and sketch reset.
+        dropped (int): Frames refused.
+    """
+
+    rate = 25
+    burst = 50
+    max_peers = 64
+    sweep_ms = 1000
+    width = 64  # sketch counters per row, power of two
+
+    def __init__(self):
+        self.buckets = {}  # mac -> [tokens * 1000, ticks_ms of last refill]
+        self.sketch = (bytearray(self.width), bytearray(self.width))
+        self.sketched = False
+        self.timer = None
+        self.dropped = 0
+
+    def admit(self, mac) -> bool:
+        now = ticks_ms()
+        b = self.buckets.get(mac)
+        if b is None:
+            if len(self.buckets) >= self.max_peers:
+                return self._admit_sketch(mac)
+            b = self.buckets[mac] = [self.burst * 1000, now]
+            self._arm()
+        else:
+            b[0] = min(b[0] + ticks_diff(now, b[1]) * self.rate, self.burst * 1000)
+            b[1] = now
+        if b[0] < 1000:
+            self.dropped += 1
+            return False
+        b[0] -= 1000
+        return True
+
+    def _admit_sketch(self, mac) -> bool:
+        h = hash(mac)
+        mask = self.width - 1
+        row0, row1 = self.sketch
+        i, j = h & mask, (h >> 6) & mask
+        if min(row0[i], row1[j]) >= self.rate * self.sweep_ms // 1000:
+            self.dropped += 1
+            return False
+        row0[i] = min(row0[i] + 1, 255)
+        row1[j] = min(row1[j] + 1, 255)
+        self.sketched = True
+        self._arm()
+        return True
+
+    def _arm(self):
+        if self.timer is None:
+            self.timer = wheel.schedule(self.sweep_ms, self._sweep)
+
+    def _sweep(self):
+        # wheel callback, forget idle macs and start a new sketch window
+        self.timer = None
+        now = ticks_ms()
+        full = self.burst * 1000
+        idle = [
+            mac
+            for mac, b in self.buckets.items()
+            if b[0] + ticks_diff(now, b[1]) * self.rate >= full
+        ]
+        for mac in idle:
+            del self.buckets[mac]
+        if self.sketched:
+            for row in self.sketch:
+                row[:] = bytes(self.width)
+            self.sketched = False
+        if self.buckets:
+            self._arm()
+
+
+class RxRing:
+    """
+    Fixed ring of preallocated receive buffers.
+
+    NowListener.rx_pump copies every accepted ESP-NOW frame into the next
+    free slot and NowListener.task decodes it in place through the slot's
+    memoryview, so sustained traffic does not churn the heap.
+
+    Attributes:
+        views (list): memoryview of each slot buffer
+        lens (list): frame length stored in each slot
+        macs (list): sender mac of each slot, reference to peers_table key
+        rssi (list): rssi of each slot
+        dropped (int): frames dropped because the ring was full
+    """
+
+    def __init__(self, size=8, frame=MAX_FRAME):
+        self.size = size
+        self.bufs = [bytearray(frame) for _ in range(size)]
+        self.views = [memoryview(b) for b in self.bufs]
+        self.lens = [0] * size
+        self.macs = [None] * size
+        self.rssi = [0] * size
+        self.wi = 0
+        self.ri = 0
+        self.count = 0
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def put(self, mac, msg, rssi) -> bool:
+        n = len(msg)
+        if self.count == self.size or n > len(self.bufs[self.wi]):
+            self.dropped += 1
+            return False
+        i = self.wi
+        self.bufs[i][:n] = msg
+        self.lens[i] = n
+        self.macs[i] = mac
+        self.rssi[i] = rssi
+        self.wi = (i + 1) % self.size
+        self.count += 1
+        self.ready.set()
+        return True
+
+    async def get(self) -> int:
+        # returns index of the oldest slot, release() it when done
+        while not self.count:
+            self.ready.clear()
+            await self.ready.wait()
+        return self.ri
+
+    def release(self):
+        self.macs[self.ri] = None
+        self.ri = (self.ri + 1) % self.size
+        self.count -= 1
+
+
+def wait_index(msg):
+    return msg.mac, msg.id
 
 
 class NowListener(object):
@@ -244,39 +566,60 @@ class NowListener(object):
 
     Attributes:
         __instance (NowListener): Singleton instance of the class.
-        connections (dict): Dictionary holding active connections indexed by connection ID.
+        connections (dict): Active connections indexed by (mac, con_id, session_id).
         last_seen (BadgeAdrDict): Dict like object with eviction after max_size reached
-        update_event (asyncio.Event): Asyncio event to notify updates.
+        broker (UpdateBroker): Batches last_seen changes for updates().
+        rx_ring (RxRing): Preallocated buffers between rx_pump() and task().
+        rx_limit (RxLimiter): Per mac rate limit applied by rx_pump().
         conn_request (asyncio.Event): Asyncio event for new connection requests.
+        pending_invites (dict): Invite tasks waiting for con_cb, indexed by connection key.
         __espnow (aioespnow.AIOESPNow): AIOESPNow instance to handle ESP-NOW communication.
 
     Methods:
         incoming_con_cb(con): Callback for handling incoming connections.
-        task(): Main task to listen and process incoming ESP-NOW messages.
-        get_updates(): Returns a generator that yields the last seen updates.
-        register_con(connection): Registers a new connection and adds the respective peer in ESP-NOW.
+        rx_pump(): Copies incoming ESP-NOW frames into rx_ring.
+        task(): Main task to process frames from rx_ring.
+        get_updates(): Returns an async iterator of BadgeDiff batches of last_seen.
+        register_con(connection): Registers a new connection and pins the ESP-NOW peer slot of its mac.
         unregister_con(connection): Unregisters a connection and removes it from the active connections.
         start(espnow): Starts the NowListener instance if not already started.
         stop(): Stops the NowListener instance if it is running.
         dispatch_app_msg(app_msg): Dispatches an application message to the corresponding connection.
-        dispatch_msg(msg, con_id): Dispatches a message to the corresponding connection based on connection ID.
+        dispatch_msg(msg, con_id, s_mac): Dispatches a message to the connection of the sender.
     """
 
     __task = None
+    __rx_task = None
     __instance = None
-    __cleanup_task = None
-    _sender_t = None
+    # Reliable control messages waiting for AckMsg:
+    # {wait_index: [OutQueMsg, sent_ms, retries, timer]}
+    waiting_ack = {}
     connections = {}
-    delivered = deque([], 50)  # Track last 50 messages to prevent re-delivery
-    last_seen = BadgeAdrDict(max_size=20, stale_multiplier=2.6)
-
-    update_event = asyncio.Event()
+    # con_id bitmap of the registered connections of each peer: {mac: bytearray},
+    # task() drops frames of con_scoped types for other con_ids undecoded
+    served = {}
+    con_scoped = (AppMsg._tid, SackMsg._tid)
+    replay = {}  # mac -> ReplayWindow, filters retried messages
+    last_seen = BadgeAdrDict(max_size=256, stale_multiplier=2.6)
+
+    broker = UpdateBroker()
     conn_request = asyncio.Event()
-    out_q = Queue(maxsize=5)
+    rx_ring = RxRing(size=8)
+    rx_limit = RxLimiter()
+    rx_budget = 8  # frames handled by task() before it yields
+    handlers = {}  # core msg _tid -> async handler(msg, mac, rssi)
+    # Round trip estimates of peers we send reliable messages to
+    peer_rtt = {}
+    max_rtt_peers = 16
 
     __espnow: aioespnow.AIOESPNow = None
     con_cb = def_con_cb
-    
+
+    # Incoming invites waiting for con_cb: {Connection.key: asyncio.Task}
+    pending_invites = {}
+    max_invites = 4
+    invite_timeout = 18  # s, below the 20 s the requester waits in connect()
+
     # Malformed message tracking: {mac: (count, first_timestamp)}
     malformed_counter = {}
     # Blocked MACs: {mac: block_expiry_timestamp}
@@ -287,11 +630,20 @@ class NowListener(object):
             NowListener.__espnow = e
         if con_cb:
             NowListener.con_cb = con_cb
+        # core message routing, one lookup by type id, see subscribe()
+        for msg_cls, handler in (
+            (BeaconMsg, self._on_beacon),
+            (AckMsg, self._on_ack),
+            (OpenConn, self._on_open),
+            (ConTerm, self._on_term),
+            (SackMsg, self._on_sack),
+            (AppMsg, self._on_app),
+        ):
+            NowListener.handlers.setdefault(msg_cls._tid, handler)
 
     def _track_malformed_message(self, mac):
         """Track malformed messages and block MAC if threshold exceeded."""
         current_time = time()
-        mac_hex = ":" .join(f"{byte:02x}" for byte in mac)
         
         if mac in NowListener.malformed_counter:
             count, first_time = NowListener.malformed_counter[mac]
@@ -299,6 +651,7 @@ class NowListener(object):
             # Reset counter if more than 10 seconds have passed
             if current_time - first_time > 10:
                 NowListener.malformed_counter[mac] = (1, current_time)
+                wheel.schedule(10000, self._forget_malformed, mac)
             else:
                 count += 1
                 NowListener.malformed_counter[mac] = (count, first_time)
@@ -307,174 +660,297 @@ class NowListener(object):
                 if count >= 3:
                     block_until = current_time + 30  # Block for 30 seconds
                     NowListener.blocked_macs[mac] = block_until
+                    wheel.schedule(30000, self._unblock, mac)
+                    mac_hex = ":".join(f"{byte:02x}" for byte in mac)
                     print(f"Blocking MAC {mac_hex} for 30s (>= 3 malformed msgs)")
         else:
             NowListener.malformed_counter[mac] = (1, current_time)
+            wheel.schedule(10000, self._forget_malformed, mac)
     
     def ack_msg(self, mac, msg_id):
-        self.out_q.put_nowait(OutQueAck(mac, msg_id))
-        # start sender task to eat the out_q
-        if self._sender_t is None or self._sender_t.done():
-            self._sender_t = asyncio.create_task(self._sender())
+        # mark for retry buffer that msg is acked
+        w = NowListener.waiting_ack.pop((mac, msg_id), None)
+        if w:
+            print(f"ack mach {mac} {msg_id}")
+            wheel.cancel(w[3])
+            if not w[2]:  # Karn: no samples from retransmitted msgs
+                NowListener.rtt_for(mac).sample(ticks_diff(ticks_ms(), w[1]))
+
+    def _on_stale(self, badge):
+        # last_seen expiry callback
+        print(f"Cleaned up stale badge {badge.mac}")
+        Beacon.reset()  # neighbourhood changed
+        self.publish(BADGE_REMOVED, badge)
+
+    def _on_evict(self, badge):
+        # last_seen is full, least recently seen badge made room
+        self.publish(BADGE_REMOVED, badge)
+
+    def publish(self, kind, badge, old=None):
+        # hands a last_seen change to the updates() subscribers
+        self.broker.publish(kind, badge, old)
+
+    def _unblock(self, mac):
+        # wheel callback, block of mac expired
+        NowListener.blocked_macs.pop(mac, None)
+        NowListener.malformed_counter.pop(mac, None)
+        mac_hex = ":".join(f"{byte:02x}" for byte in mac)
+        print(f"Unblocked MAC {mac_hex} - block expired")
+
+    def _forget_malformed(self, mac):
+        # wheel callback, malformed counting window of mac is over
+        entry = NowListener.malformed_counter.get(mac)
+        if entry and mac not in NowListener.blocked_macs and time() - entry[1] >= 10:
+            del NowListener.malformed_counter[mac]
+
+    async def rx_pump(self):
+        """
+        Drains the ESP-NOW driver into rx_ring. airecv() reuses the driver side
+        buffers, frames from blocked or weak peers and from peers over their
+        rx_limit rate are dropped before copying.
+        """
+        e = self.__espnow
+        ring = NowListener.rx_ring
+        limit = NowListener.rx_limit
+        while True:
+            mac, msg = await e.airecv()
+            if mac is None:
+                continue
 
-    async def cleanup_task(self):
-        """Periodically cleanup stale badges from last_seen and blocked MACs."""
-        try:
-            while True:
-                await asyncio.sleep(5)  # Check every 5 seconds
-                removed = NowListener.last_seen.cleanup_stale(Beacon.timeout)
-                if removed > 0:
-                    print(f"Cleaned up {removed} stale badge(s)")
-                    self.update_event.set()  # Notify UI to update
-                
-                # Cleanup expired blocked MACs
-                current_time = time()
-                expired_blocks = [mac for mac, expiry in NowListener.blocked_macs.items() if current_time > expiry]
-                for mac in expired_blocks:
-                    del NowListener.blocked_macs[mac]
-                    if mac in NowListener.malformed_counter:
-                        del NowListener.malformed_counter[mac]
-                    mac_hex = ":".join(f"{byte:02x}" for byte in mac)
-                    print(f"Unblocked MAC {mac_hex} - block expired")
-        except Exception as e:
-            print(f"cleanup_task error: {e}")
+            # Check if MAC is blocked, expired blocks are removed by a wheel timer
+            if mac in NowListener.blocked_macs and time() < NowListener.blocked_macs[mac]:
+                continue
+
+            rssi = e.peers_table[mac][0]
+            if rssi < -70:
+                continue
+
+            if not limit.admit(mac):
+                continue
+
+            ring.put(mac, msg, rssi)
 
     async def task(self):
         """
-        Main task to listen and process incoming ESP-NOW messages.
-        Handles different types of messages (BeaconMsg, OpenConn, ConTerm, AppMsg) and updates connections.
+        Main task to process incoming ESP-NOW frames from rx_ring.
+        Routes each message by its type id through handlers (BeaconMsg, AckMsg,
+        OpenConn, ConTerm, SackMsg, AppMsg by default) and updates connections.
         """
         print("NowListener active")
         no_ack = 0
-        async for mac, msg in self.__espnow:
-            if mac is None:
+        ring = NowListener.rx_ring
+        budget = NowListener.rx_budget
+        while True:
+            # Handle queued frames in bursts of rx_budget, then give rx_pump,
+            # tx and the UI a turn. A listener that never yields starves
+            # airecv and the ESP-NOW driver buffer overflows.
+            if not budget or not ring.count:
+                budget = NowListener.rx_budget
+                await asyncio.sleep(0)
+            i = await ring.get()
+            budget -= 1
+            mac = ring.macs[i]
+            rssi = ring.rssi[i]
+
+            # Header checks from the ring buffer before anything is decoded:
+            # junk and other firmware versions count as malformed, channel
+            # frames of connections we do not have are dropped quietly
+            view, n = ring.views[i], ring.lens[i]
+            tid = frame_tid(view, n)
+            if tid is None or tid not in BadgeMsg._tid_reg:
+                ring.release()
+                self._track_malformed_message(mac)
                 continue
-
-            # Check if MAC is blocked
-            if mac in NowListener.blocked_macs:
-                if time() < NowListener.blocked_macs[mac]:
-                    # Still blocked, silently ignore
-                    continue
-                else:
-                    # Block expired, cleanup will handle removal
-                    pass
-
-            rssi = self.__espnow.peers_table[mac][0]
-            if rssi < -70:
+            if tid in NowListener.con_scoped and not self.serves(mac, view[CON_ID_OFF]):
+                ring.release()
                 continue
 
             # Protect deserialization so a malformed message doesn't cancel the listener
             try:
-                incm_msg = BadgeMsg.desrlz(msg)
+                incm_msg = BadgeMsg.desrlz(view, n)
+                if incm_msg is None:
+                    mac_hex = ":".join(f"{byte:02x}" for byte in mac)
+                    head = bytes(view[: min(n, 32)])
+                    print(f"Ignoring malformed msg from {mac_hex} len={n} head={head.hex()}")
             except Exception as e:
                 mac_hex = ":".join(f"{byte:02x}" for byte in mac)
                 print(f"NowListener: fatal deserialization from {mac_hex}: {e}")
-                self._track_malformed_message(mac)
-                continue
+                incm_msg = None
+            finally:
+                ring.release()
 
             if incm_msg is None:
-                mac_hex = ":".join(f"{byte:02x}" for byte in mac)
-                head = msg[:32] if isinstance(msg, (bytes, bytearray)) else b""
-                print(f"Ignoring malformed msg from {mac_hex} len={len(msg)} head={head.hex()}")
                 self._track_malformed_message(mac)
                 continue
 
-            print(f">>>{mac}:{incm_msg}")
-
-            if isinstance(incm_msg, BeaconMsg):
-                NowListener.last_seen[mac] = BadgeAdr(mac, incm_msg.nick, rssi, time())
-                self.update_event.set()  # trigger updates function
-            elif isinstance(incm_msg, AckMsg):
-                NowListener.last_seen.update_last_seen(mac, time())
-                # mark for retry buffer that msg is acked
-                self.ack_msg(mac, incm_msg.id)
-
-            elif isinstance(incm_msg, OpenConn):
-                NowListener.last_seen.update_last_seen(mac, time())
-                
-                # Check if there's an existing connection for this con_id and MAC
-                existing_conn = self.connections.get(incm_msg.con_id)
-                if existing_conn and not existing_conn.closed:
-                    # Check if this is from the same peer (reply to our connection request)
-                    if existing_conn.c_mac == mac:
-                        # This is a reply to our connection request, dispatch it
-                        if await self.dispatch_msg(incm_msg, incm_msg.con_id, mac):
-                            self.ack_msg(mac, incm_msg.id)
-                            continue
-                    else:
-                        # Existing connection with different peer - reject new one
-                        print(f"Rejecting OpenConn: con_id {incm_msg.con_id} already used by different peer")
-                        await send_message(
-                            self.__espnow, mac, 
-                            OpenConn(incm_msg.con_id, accept=False).srlz(), 
-                            sync=False
-                        )
-                        continue
-                elif existing_conn and existing_conn.closed:
-                    # Old closed connection still registered - clean it up
-                    print(f"Cleaning up closed connection for con_id={incm_msg.con_id}")
-                    NowListener.unregister_con(existing_conn)
-
-                # Add new incoming connection, ack the incoming OpenConn
-                await send_message(
-                    self.__espnow, mac, AckMsg(id=incm_msg.id).srlz(), sync=False
-                )
-
-                # proto connection, not yet capable of receiving other messages
-                conn = Connection(mac, incm_msg.con_id, self.__espnow)
-                # Use session_id from incoming OpenConn if available
-                if hasattr(incm_msg, 'session_id') and incm_msg.session_id:
-                    conn.session_id = incm_msg.session_id
-                conn.active = True
-
-                try:
-                    # ask user process can we accept connection
-                    (await NowListener.con_cb(conn)) or 1 / 0
-                except (asyncio.TimeoutError, ZeroDivisionError):
-                    # connection was not opened in time, or it returned false
-                    NowListener.unregister_con(conn)
-                    await asyncio.sleep(0.1)  # Allow now esp stack to run
-                    await conn.terminate()
+            # frames bundled by the sender are handled one by one
+            msgs = incm_msg.msgs if isinstance(incm_msg, BundleMsg) else (incm_msg,)
+            for incm_msg in msgs:
+                print(f">>>{mac}:{incm_msg}")
+                handler = NowListener.handlers.get(incm_msg._tid)
+                if handler is None:
+                    tmp = ":".join(f"{byte:02x}" for byte in mac)
+                    print(f"{tmp} [{rssi}dBm] {incm_msg} :")
                     continue
+                try:
+                    await handler(incm_msg, mac, rssi)
+                except Exception as e:
+                    print(f"NowListener: {incm_msg.msg_type} handler failed: {e}")
 
-                # connection accepted, register to allow subsequent messages
-                NowListener.register_con(conn)
-                await asyncio.sleep(0.1)  # Allow now esp stack to run
-                # Opening connection by replying OpenConn back with same msg id and session_id
-                oc = OpenConn(incm_msg.con_id, accept=True, session_id=conn.session_id)
-                oc.__id = incm_msg.id
-                NowListener.send_msg(oc, mac)
-                # await send_message(self.__espnow, mac, msg, sync=False)
+    @classmethod
+    def subscribe(cls, msg_cls, handler):
+        """
+        Routes incoming core messages of msg_cls (registered with
+        BadgeMsg.register) to handler instead of the default one.
 
-            elif isinstance(incm_msg, ConTerm):
+        Args:
+            msg_cls: Message class, looked up by its _tid.
+            handler: async handler(msg, mac, rssi), owns msg and may free() it
+        """
+        cls.handlers[msg_cls._tid] = handler
+
+    async def _on_beacon(self, msg: BeaconMsg, mac, rssi):
+        seen = NowListener.last_seen
+        old = seen.store.get(mac)
+        # with a full table an unknown badge is most likely one evicted to
+        # make room, that churn is no change of the neighbourhood
+        Beacon.heard(old is None and len(seen.store) < seen.max_size)
+        badge = BadgeAdr(mac, msg.nick, rssi, time(), msg.games, msg.flags)
+        msg.free()
+        NowListener.last_seen[mac] = badge
+        if old is None:
+            self.publish(BADGE_ADDED, badge)
+        elif (
+            old.nick != badge.nick
+            or old.rssi != badge.rssi
+            or old.flags != badge.flags
+            or old.games != badge.games
+        ):
+            self.publish(BADGE_UPDATED, badge, old)
+
+    async def _on_ack(self, msg: AckMsg, mac, rssi):
+        NowListener.last_seen.update_last_seen(mac, time())
+        # mark for retry buffer that msg is acked
+        self.ack_msg(mac, msg.id)
+        msg.free()
+
+    async def _on_open(self, incm_msg: OpenConn, mac, rssi):
+        NowListener.last_seen.update_last_seen(mac, time())
+
+        # Same peer, con_id and session: reply to our connection request or a
+        # retry of an invite already being handled. Other peers and sessions
+        # get their own connection, con_id only has to be unique per peer.
+        existing_conn = self.find_con(incm_msg.con_id, mac, incm_msg.session_id)
+        if existing_conn and not existing_conn.closed:
+            if await self.dispatch_msg(incm_msg, incm_msg.con_id, mac):
                 self.ack_msg(mac, incm_msg.id)
-                NowListener.last_seen.update_last_seen(mac, time())
+                return
+        elif existing_conn and existing_conn.closed:
+            # Old closed connection still registered - clean it up
+            print(f"Cleaning up closed connection for con_id={incm_msg.con_id}")
+            NowListener.unregister_con(existing_conn)
+
+        if not incm_msg.accept:
+            # decline of a request we no longer wait for, never an invite
+            self.ack_msg(mac, incm_msg.id)
+            return
+
+        # Bounded table of outstanding invites, decline when full so a
+        # crowd of challengers cannot pile up dialogs or tasks. The decline
+        # echoes session and msg id so it reaches the pending connect().
+        if len(NowListener.pending_invites) >= NowListener.max_invites:
+            print(f"Declining OpenConn: {len(NowListener.pending_invites)} invites pending")
+            oc = OpenConn(incm_msg.con_id, accept=False, session_id=incm_msg.session_id)
+            oc._id = incm_msg.id
+            self.queue_frame(mac, oc.srlz())
+            return
+
+        # Add new incoming connection, ack the incoming OpenConn
+        self.queue_frame(mac, AckMsg.pack(incm_msg.id))
+
+        # proto connection, not yet capable of receiving other messages
+        conn = Connection(
+            mac, incm_msg.con_id, self.__espnow, session_id=incm_msg.session_id
+        )
+        conn.peer_caps(incm_msg.caps)
+        conn.active = True
+
+        # ask user process in its own task, listener keeps dispatching
+        # beacons, acks and app messages while the dialog is open
+        NowListener.pending_invites[conn.key] = asyncio.create_task(
+            self._invite_task(conn, incm_msg.id)
+        )
+
+    async def _on_term(self, msg: ConTerm, mac, rssi):
+        self.ack_msg(mac, msg.id)
+        NowListener.last_seen.update_last_seen(mac, time())
+
+        conn = self.find_con(msg.con_id, mac, msg.session_id)
+        if conn:
+            print(f"con term for {msg=}")
+            await conn.terminate(send_out=True, reply_to_id=msg.id)
+            NowListener.unregister_con(conn)
+        else:
+            self.queue_frame(mac, AckMsg.pack(msg.id))
+
+    async def _on_sack(self, msg: SackMsg, mac, rssi):
+        NowListener.last_seen.update_last_seen(mac, time())
+        conn = self.find_con(msg.con_id, mac, msg.session_id)
+        if conn:
+            conn.channel.on_ack(msg.cum, msg.sack, msg.credit)
+        msg.free()
+
+    async def _on_app(self, msg: AppMsg, mac, rssi):
+        NowListener.last_seen.update_last_seen(mac, time())
+        # the connection channel acks and orders app messages
+        if not await self.dispatch_app_msg(msg, mac):
+            print(f"No receiver for RCV:{mac}->{msg=}")
+        # the channel keeps only the content
+        msg.free()
+
+    async def _invite_task(self, conn: Connection, req_id):
+        """
+        Runs the accept/decline decision for one incoming OpenConn.
 
-                if incm_msg.con_id in self.connections:
-                    print(f"con term for {incm_msg=}")
-                    conn = self.connections[incm_msg.con_id]
-                    await conn.terminate(send_out=True, reply_to_id=incm_msg.id)
-                    NowListener.unregister_con(conn)
-                else:
-                    await send_message(
-                        self.__espnow, mac, AckMsg(id=incm_msg.id).srlz(), sync=False
-                    )
-
-            elif isinstance(incm_msg, AppMsg):
-                NowListener.last_seen.update_last_seen(mac, time())
-                await send_message(
-                    self.__espnow, mac, AckMsg(id=incm_msg.id).srlz(), sync=False
+        Args:
+            conn (Connection): Proto connection created for the invite.
+            req_id: Message id of the incoming OpenConn, echoed in the reply.
+        """
+        key = conn.key
+        try:
+            try:
+                # ask user process can we accept connection
+                accepted = await asyncio.wait_for(
+                    NowListener.con_cb(conn), NowListener.invite_timeout
                 )
+            except asyncio.TimeoutError:
+                # connection was not opened in time
+                accepted = False
 
-                if not await self.dispatch_app_msg(incm_msg, mac):
-                    print(f"No receiver for RCV:{mac}->{incm_msg=}")
+            if conn.closed:
+                # peer gave up (ConTerm) while the invite was pending
+                print(f"invite {conn.con_id} withdrawn by peer")
+                return
 
-            else:
-                tmp = ":".join(f"{byte:02x}" for byte in mac)
-                print(f"{tmp} [{rssi}dBm] {msg} :")
-            await asyncio.sleep(
-                0.1
-            )  # Do not touch, MSG stack crashes when running without
+            if not accepted:
+                NowListener.unregister_con(conn)
+                await asyncio.sleep(0.1)  # Allow now esp stack to run
+                await conn.terminate()
+                return
+
+            # connection accepted, register to allow subsequent messages
+            NowListener.register_con(conn)
+            await asyncio.sleep(0.1)  # Allow now esp stack to run
+            # Opening connection by replying OpenConn back with same msg id and session_id
+            oc = OpenConn(
+                conn.con_id, accept=True, session_id=conn.session_id, caps=LOCAL_CAPS
+            )
+            oc._id = req_id
+            NowListener.send_msg(oc, conn.c_mac)
+        except Exception as e:
+            print(f"invite {conn.con_id} error: {e}")
+        finally:
+            NowListener.pending_invites.pop(key, None)
 
     @classmethod
     def updates(cls, filter_mac=None):
@@ -482,100 +958,91 @@ class NowListener(object):
 
     def get_updates(self, filter_mac=None):
         """
-        `get_updates` returns a generator that yields the latest BadgeAddr.
+        `get_updates` returns an async iterator of the changes of last_seen.
 
-        Returns:
-            generator: A generator that yields the last seen updates.
-            filter_mac: bytes(6) mac return only updates to this mac
-        """
-
-        class Aiter:
-            def __init__(self, scanner):
-                self.scanner = scanner
+        Every item is a list of BadgeDiff(kind, badge, old) with kind one of
+        BADGE_ADDED, BADGE_REMOVED and BADGE_UPDATED (old is the replaced
+        BadgeAdr), coalesced per badge and delivered at most once every
+        broker.frame_ms. A subscriber that falls too far behind gets
+        [BADGE_RESET] instead and should rebuild its view from last_seen.
 
-            def __aiter__(self):
-                return self
+        Args:
+            filter_mac: bytes(6) mac return only updates to this mac
 
-            async def __anext__(self):
-                while True:
-                    await self.scanner.update_event.wait()
-                    self.scanner.update_event.clear()
-                    latest = self.scanner.last_seen.latest()
-                    if filter_mac is None or filter_mac == latest.mac:
-                        return latest
+        Returns:
+            Subscription, close() it when done.
+        """
+        return self.broker.subscribe(filter_mac)
 
-        return Aiter(self)
+    @classmethod
+    def _retry_due(cls, k):
+        # wheel callback, message k was not acked within rto
+        w = NowListener.waiting_ack.get(k)
+        if w is None:
+            return
+        out_que_msg = w[0]
+        if w[2] >= out_que_msg.retry:
+            print(f"retry timeout {k=} {out_que_msg=}")
+            del NowListener.waiting_ack[k]
+            return
+        rtt = NowListener.rtt_for(out_que_msg.mac)
+        rtt.backoff()
+        w[1], w[2] = ticks_ms(), w[2] + 1
+        w[3] = wheel.schedule(rtt.rto, cls._retry_due, k)
+        print(f"<<{'r'*w[2]}{out_que_msg.msg} {out_que_msg=} {rtt}")
+        NowListener.queue_frame(out_que_msg.mac, out_que_msg.msg)
+
+    @staticmethod
+    def queue_frame(mac, frame, prio=PRIO_CTRL):
+        """
+        Queues a serialized core message for mac on the tx scheduler, frames
+        for the same mac go out together as one BundleMsg when they fit.
+        """
+        tx.put(mac, frame, prio)
 
-    async def _sender(self):
-        # temporary task to send messages for retry times or until ack arrives
-        timeout_ms = 500
-        waiting_ack = {}
-        start = ticks_ms()
-        while self.out_q.qsize() > 0 or waiting_ack:
-            try:
-                out_q_t: OutQueMsg | OutQueAck = await asyncio.wait_for(
-                    self.out_q.get(), timeout_ms / 1000
-                )
-                if type(out_q_t) == OutQueMsg:
-                    waiting_ack[wait_index(out_q_t)] = out_q_t
-                    await send_message(
-                        self.__espnow, out_q_t.mac, out_q_t.msg, sync=False
-                    )
-                elif type(out_q_t) == OutQueAck:
-                    w_index = wait_index(out_q_t)
-                    if w_index in waiting_ack:
-                        print(f"ack mach {out_q_t=}")
-                        del waiting_ack[w_index]
-
-                if ticks_diff(ticks_ms(), start) > timeout_ms:
-                    raise asyncio.TimeoutError
+    @classmethod
+    def replay_window(cls, mac) -> ReplayWindow:
+        w = cls.replay.get(mac)
+        if w is None:
+            if len(cls.replay) >= cls.max_rtt_peers:
+                cls.replay.pop(next(iter(cls.replay)))
+            w = cls.replay[mac] = ReplayWindow()
+        return w
 
-            except asyncio.TimeoutError:
-                ack_items = waiting_ack.items()
-                for k, out_que_msg in ack_items:
-                    if out_que_msg.retry <= 0:
-                        print(f"retry timeout {k=} {out_que_msg=}")
-                        del waiting_ack[k]
-                        continue
-
-                    print(f"<<{'r'*out_que_msg.retry}{out_que_msg.msg} {out_que_msg=}")
-                    await send_message(
-                        self.__espnow, out_que_msg.mac, out_que_msg.msg, sync=False
-                    )
-                    waiting_ack[k] = OutQueMsg(
-                        out_que_msg.msg,
-                        out_que_msg.mac,
-                        out_que_msg.id,
-                        out_que_msg.retry - 1,
-                    )
-
-                start = ticks_ms()
-
-        print("sender done")
+    @classmethod
+    def rtt_for(cls, mac) -> RttEstimator:
+        """Returns the RttEstimator of peer mac, shared by all its connections."""
+        rtt = cls.peer_rtt.get(mac)
+        if rtt is None:
+            if len(cls.peer_rtt) >= cls.max_rtt_peers:
+                cls.peer_rtt.pop(next(iter(cls.peer_rtt)))
+            rtt = cls.peer_rtt[mac] = RttEstimator()
+        return rtt
 
     @classmethod
     def send_msg(cls, msg: BadgeMsg, mac, sync=False, retry=3):
-        out_q = cls.__instance.out_q
-        out_q.put_nowait(OutQueMsg(msg.srlz(), mac, msg.id, retry))
-
-        # start sender task
-        if cls.__instance._sender_t is None or cls.__instance._sender_t.done():
-            cls.__instance._sender_t = asyncio.create_task(cls.__instance._sender())
+        # sends msg and retransmits it until AckMsg arrives or retry runs out
+        out_q_t = OutQueMsg(msg.srlz(), mac, msg.id, retry)
+        k = wait_index(out_q_t)
+        old = cls.waiting_ack.get(k)
+        if old:
+            wheel.cancel(old[3])
+        w = cls.waiting_ack[k] = [out_q_t, ticks_ms(), 0, None]
+        w[3] = wheel.schedule(cls.rtt_for(mac).rto, cls._retry_due, k)
+        cls.queue_frame(mac, out_q_t.msg)
 
     @classmethod
     def register_con(cls, connection: "Connection"):
         """
-        Registers a new connection and adds the respective peer in ESP-NOW.
+        Registers a new connection and pins the ESP-NOW peer slot of its mac.
 
         Args:
             connection (Connection): The connection instance to register.
         """
         print(f"register: {connection.con_id}")
-        cls.connections[connection.con_id] = connection
-        try:
-            cls.__espnow.add_peer(connection.c_mac)
-        except Exception:
-            pass
+        cls.connections[connection.key] = connection
+        cls.update_served(connection.c_mac)
+        cls.update_busy()
 
     @classmethod
     def unregister_con(cls, connection: "Connection"):
@@ -584,14 +1051,47 @@ class NowListener(object):
 
         Args:
             connection (Connection): The connection instance to unregister.
+
+        Returns:
+            bool: True if the connection was registered.
         """
-        if connection.con_id in cls.connections:
+        key = connection.key
+        if cls.connections.get(key) is connection:
             print(f"unregister: {connection.con_id}")
-            del cls.connections[connection.con_id]
-            # Note: We intentionally do NOT clean up the delivered deque here.
-            # Keeping old message IDs prevents stale messages (still in retry queues)
-            # from being re-delivered in new sessions. The deque's max size will
-            # naturally evict old entries over time.
+            del cls.connections[key]
+            cls.update_served(connection.c_mac)
+            cls.update_busy()
+            # Note: We intentionally do NOT reset the replay window of the peer.
+            # Keeping it prevents stale messages (still in retry queues)
+            # from being re-delivered in new sessions.
+            return True
+        return False
+
+    @classmethod
+    def update_served(cls, mac):
+        # rebuilds the con_id bitmap of mac after its connections changed,
+        # peers with a session keep their ESP-NOW peer slot
+        bits = bytearray(32)
+        for c_mac, con_id, _ in cls.connections:
+            if c_mac == mac:
+                bits[con_id >> 3] |= 1 << (con_id & 7)
+        if any(bits):
+            cls.served[mac] = bits
+            peers.pin(mac)
+        else:
+            cls.served.pop(mac, None)
+            peers.unpin(mac)
+
+    @classmethod
+    def serves(cls, mac, con_id) -> bool:
+        # mac has a registered connection on con_id, any session
+        bits = cls.served.get(mac)
+        return bits is not None and bool(bits[con_id >> 3] & (1 << (con_id & 7)))
+
+    @classmethod
+    def update_busy(cls):
+        # beacons tell challengers whether we are already in a connection
+        Beacon.set_busy(any(not c.closed for c in cls.connections.values()))
 
     @classmethod
     def start(cls, espnow):
@@ -606,8 +1106,11 @@ class NowListener(object):
         """
         if not cls.__instance:
             cls.__instance = cls(espnow)
+            tx.start(espnow)
             cls.__task = asyncio.create_task(cls.__instance.task())
-            cls.__cleanup_task = asyncio.create_task(cls.__instance.cleanup_task())
+            cls.__rx_task = asyncio.create_task(cls.__instance.rx_pump())
+            cls.last_seen.on_evict = cls.__instance._on_evict
+            cls.last_seen.expire(Beacon.period(), cls.__instance._on_stale)
             return cls.__task
 
     @classmethod
@@ -618,10 +1121,27 @@ class NowListener(object):
         if cls.__task:
             cls.__task.cancel()
             cls.__task = None
+        if cls.__rx_task:
+            cls.__rx_task.cancel()
+            cls.__rx_task = None
+
+    def find_con(self, con_id, s_mac, session_id=None):
+        """
+        Finds the connection for con_id and session_id that belongs to peer s_mac.
+
+        Args:
+            con_id: The connection ID.
+            s_mac: Sender mac.
+            session_id: Session the message belongs to.
+
+        Returns:
+            Connection or None, messages of stale sessions find nothing.
+        """
+        return self.connections.get((s_mac, con_id, session_id))
 
     async def dispatch_app_msg(self, app_msg: AppMsg, s_mac):
         """
-        Dispatches an application message to the corresponding connection.
+        Dispatches an application message to the channel of the corresponding connection.
 
         Args:
             app_msg (AppMsg): The application message.
@@ -629,66 +1149,33 @@ class NowListener(object):
         Returns:
             bool: True if the message was dispatched, False otherwise.
         """
-        if app_msg.con_id in self.connections:
-            if self.connections[app_msg.con_id].c_mac != s_mac:
-                print(f"con_id mismatch {app_msg.con_id=} {s_mac=}")
-                # TODO: send ConTerm for mismached
-                return False
-            # Pass only the inner content to app
-            # filter out retries, don't deliver message with same id
-            w_index = wait_index_mac(s_mac, msg_id=app_msg.id)
-            if w_index not in NowListener.delivered:
-                await self.connections[app_msg.con_id].recv_msg(app_msg.content)
-                NowListener.delivered.append(w_index)
-                return True
-            else:
-                print(f"Filtered out {w_index=} {app_msg=}")
-
-        return False
+        conn = self.find_con(app_msg.con_id, s_mac, app_msg.session_id)
+        if conn is None:
+            return False
+        # channel filters out retries and passes only the inner content to app
+        await conn.channel.on_data(app_msg)
+        return True
 
     async def dispatch_msg(self, msg: BadgeMsg, con_id, s_mac):
         """
-        Dispatches a message to the corresponding connection based on connection ID.
+        Dispatches a message to the connection of the sender.
 
         Args:
-            msg (BadgeMsg): The message to dispatch.
+            msg (BadgeMsg): The message to dispatch, carries the session_id.
             con_id: The connection ID.
+            s_mac: Sender mac.
 
         Returns:
             bool: True if the message was dispatched, False otherwise.
         """
-        if con_id in self.connections:
-            conn = self.connections[con_id]
-            if conn.c_mac != s_mac:
-                print(f"con_id mismatch {con_id=} {s_mac=}")
-                # TODO: send ConTerm for mismached
-                return False
-
-            # Validate session ID for AppMsg to prevent cross-session message routing
-            if isinstance(msg, AppMsg):
-                msg_session = getattr(msg, 'session_id', None)
-                if msg_session is not None and msg_session != conn.session_id:
-                    print(f"session_id mismatch: msg={msg_session} conn={conn.session_id}, ignoring stale message")
-                    # Mark as delivered even though we're ignoring it, to prevent repeated checks
-                    w_index = wait_index_mac(s_mac, msg_id=msg.id)
-                    if w_index not in NowListener.delivered:
-                        NowListener.delivered.append(w_index)
-                    # Still send ACK to prevent retries, but don't deliver the message
-                    await send_message(
-                        self.__espnow, s_mac, AckMsg(id=msg.id).srlz(), sync=False
-                    )
-                    return True
-
+        conn = self.find_con(con_id, s_mac, msg.session_id)
+        if conn:
             # filter out retries, don't deliver message with same id
-            w_index = wait_index_mac(s_mac, msg_id=msg.id)
-            if w_index not in NowListener.delivered:
+            if self.replay_window(s_mac).check(msg.id):
                 await conn.recv_msg(msg)
-                NowListener.delivered.append(w_index)
 
             # despite was msg retry or not send ack
-            await send_message(
-                self.__espnow, s_mac, AckMsg(id=msg.id).srlz(), sync=False
-            )
+            self.queue_frame(s_mac, AckMsg.pack(msg.id))
             return True
         return False  # Connection was not found
 
@@ -711,28 +1198,118 @@ class Beacon(AProc):
     # Beacon.start(task=True) will return a asyncio.task ans start running Beacon
     # Beacon.stop() will cancel the running task
     # Beacon.suspend(True|False) will suspend/resume the Beacon task # why not to use stop start?
+    #
+    # Beacons are scheduled Trickle style (RFC 6206): the interval starts at
+    # `timeout` seconds and doubles up to `timeout * 2**doublings` while the
+    # neighbourhood is stable, a new or vanished badge resets it. Each beacon
+    # goes out at a random point of the second half of its interval and is
+    # skipped when `redundancy` beacons were already heard in that interval,
+    # but never more than `max_suppress` times in a row, see period().
+    #
+    # The beacon frame carries the con_id bitmap of the multiplayer games and
+    # the busy flag, it is serialized once and rebuilt by set_games() and
+    # set_busy() only when they change.
     __espnow: aioespnow.AIOESPNow = None
     __id: BeaconMsg = None
     peer = None
     _susp = asyncio.Event()
     timeout = 5
+    doublings = 2
+    redundancy = 3
+    max_suppress = 1
+    _interval = 5  # current interval
+    _heard = 0  # beacons heard in the current interval
+    _reset = asyncio.Event()
+    _games = b""
+    _flags = 0
+    _frame = None  # serialized BeaconMsg
     _task = None
 
     @classmethod
     def suspend(cls, value: bool):
         cls._susp.clear() if value else cls._susp.set()
 
+    @classmethod
+    def _build(cls):
+        if cls.__id:
+            cls._frame = BeaconMsg.pack(cls.__id.nick, cls._games, cls._flags)
+
+    @classmethod
+    def set_games(cls, con_ids):
+        games = con_id_bitmap(con_ids)
+        if games != cls._games:
+            cls._games = games
+            cls._build()
+
+    @classmethod
+    def set_busy(cls, busy: bool):
+        flags = cls._flags | BEACON_BUSY if busy else cls._flags & ~BEACON_BUSY
+        if flags != cls._flags:
+            cls._flags = flags
+            cls._build()
+            cls.reset()  # let challengers know soon
+
+    @classmethod
+    def period(cls):
+        # current interval plus one suppressed beacon, base of stale expiry.
+        # The neighbours share our interval, they reset on the same changes
+        return cls._interval * (cls.max_suppress + 1)
+
+    @classmethod
+    def _set_interval(cls, interval):
+        if interval != cls._interval:
+            cls._interval = interval
+            NowListener.last_seen.set_period(cls.period())
+
+    @classmethod
+    def heard(cls, new: bool):
+        # a beacon was received, new when its badge was not known yet
+        cls._heard += 1
+        if new:
+            cls.reset()
+
+    @classmethod
+    def reset(cls):
+        # neighbourhood changed, back to the shortest interval
+        if cls._interval > cls.timeout:
+            cls._reset.set()
+
+    @classmethod
+    async def _wait(cls, secs):
+        # sleeps secs, returns True when reset() cut it short
+        try:
+            await asyncio.wait_for(cls._reset.wait(), secs)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
     @classmethod
     async def task(cls, *args, **kwargs):
         try:
+            interval = cls.timeout
+            suppressed = 0
             while not cls.stop_event.is_set():
-                msg = BeaconMsg(nick=cls.__id.nick).srlz()
-                await send_message(cls.__espnow, cls.peer, msg)
-                await asyncio.sleep(cls.timeout)
+                cls._set_interval(interval)
+                cls._heard = 0
+                cls._reset.clear()
+                t = interval * (1 + random.random()) / 2
+                reset = await cls._wait(t)
+                if not reset:
+                    if cls._heard < cls.redundancy or suppressed >= cls.max_suppress:
+                        tx.put(cls.peer, cls._frame, PRIO_BEACON)
+                        suppressed = 0
+                    else:
+                        suppressed += 1
+                    reset = await cls._wait(interval - t)
+                if reset:
+                    interval = cls.timeout
+                else:
+                    interval = min(interval * 2, cls.timeout * (1 << cls.doublings))
                 if not cls._susp.is_set():
                     print("Beacon suspended...")
                     await cls._susp.wait()
                     print("...Beacon resumed")
+                    interval = cls.timeout
         except Exception as e:
             print(f"Beacon exeption {e}")
 
@@ -740,13 +1317,10 @@ class Beacon(AProc):
     def setup(cls, espnow, id: BeaconMsg, peer=b"\xbb\xbb\xbb\xbb\xbb\xbb", timeout=5):
         Beacon.__id = id
         Beacon.__espnow = espnow
+        Beacon._build()
+        tx.start(espnow)
         Beacon.timeout = timeout
+        Beacon._set_interval(timeout)
         Beacon._susp.set()
         Beacon.peer = peer
-        try:
-            Beacon.__espnow.add_peer(peer)
-        except OSError as err:
-            if len(err.args) < 2:
-                raise err
-            if err.args[1] == "ESP_ERR_ESPNOW_EXIST":
-                print("Addr exist")
+        peers.pin(peer)
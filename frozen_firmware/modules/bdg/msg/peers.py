@@ -0,0 +1,100 @@
+class PeerTable:
+    """
+    Owner of the slots of the ESP-NOW peer table.
+
+    Unicast frames need their destination in the driver's peer table, which
+    holds only a few entries. Every add_peer/del_peer of the messaging stack
+    goes through here: peers of registered connections and the beacon
+    address are pinned, everyone else (acks and declines to badges we have
+    no session with) gets a slot on demand, taken from the least recently
+    used unpinned peer when the table is full. The TX path only calls
+    ensure(), a dict lookup while the peer already has its slot.
+
+    Attributes:
+        size (int): Slots managed, ESP_NOW_MAX_TOTAL_PEER_NUM of the driver.
+        evicted (int): Peers removed to make room, for diagnostics.
+    """
+
+    size = 20
+
+    def __init__(self):
+        self.espnow = None
+        # macs with a slot, least recently used first. A list, dicts do not
+        # keep insertion order on MicroPython and the table is small
+        self.lru = []
+        self.pinned = set()
+        self.evicted = 0
+
+    def start(self, espnow):
+        if self.espnow is espnow:
+            return
+        self.espnow = espnow
+        # adopt peers added before we took over
+        self.lru = [p[0] for p in espnow.get_peers()]
+        for mac in self.pinned:
+            self.ensure(mac)
+
+    def pin(self, mac):
+        # session peer, gets its slot now and keeps it until unpin()
+        self.pinned.add(mac)
+        if self.espnow is not None:
+            self.ensure(mac)
+
+    def unpin(self, mac):
+        # the slot stays until it is needed for another peer
+        self.pinned.discard(mac)
+
+    def ensure(self, mac) -> bool:
+        """
+        Makes sure mac has a slot before a frame is sent to it.
+
+        Returns:
+            bool: False when no slot could be made, every slot is pinned.
+        """
+        lru = self.lru
+        if lru and lru[-1] == mac:
+            return True
+        if mac in lru:
+            lru.remove(mac)
+            lru.append(mac)
+            return True
+        if len(lru) >= self.size and not self._evict():
+            print(f"peers: no free slot for {mac}")
+            return False
+        try:
+            self.espnow.add_peer(mac)
+        except OSError as err:
+            if len(err.args) < 2:
+                raise err
+            if err.args[1] == "ESP_ERR_ESPNOW_FULL":
+                # driver has peers we do not know of, make room once more
+                if not self._evict():
+                    return False
+                self.espnow.add_peer(mac)
+            elif err.args[1] != "ESP_ERR_ESPNOW_EXIST":
+                raise err
+        lru.append(mac)
+        return True
+
+    def forget(self, mac):
+        # driver lost the peer, the next ensure() adds it again
+        if mac in self.lru:
+            self.lru.remove(mac)
+
+    def _evict(self) -> bool:
+        # frees the slot of the least recently used unpinned peer
+        for mac in self.lru:
+            if mac not in self.pinned:
+                break
+        else:
+            return False
+        self.lru.remove(mac)
+        self.evicted += 1
+        try:
+            self.espnow.del_peer(mac)
+        except OSError as err:
+            print(f"peers: del {mac} failed: {err}")
+        return True
+
+
+peers = PeerTable()
@@ -0,0 +1,120 @@
+import asyncio
+from time import ticks_ms, ticks_diff, ticks_add
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel shared by the messaging stack.
+
+    Deadlines (retransmissions, stale badges, blocked MACs) are hashed into
+    `slots` buckets by their expiry tick. Every tick only the bucket of that
+    tick is visited, so the periodic cost does not grow with the number of
+    peers or messages being tracked. Deadlines further away than one turn of
+    the wheel stay in their bucket until their turn comes. The wheel task
+    sleeps until the next bucket with a due timer, so a few long timers do
+    not wake the badge every tick.
+
+    Callbacks are plain functions run from the wheel task, they must not
+    block, start a task for async work.
+
+    Attributes:
+        tick_ms (int): Resolution of the wheel in milliseconds.
+        slots (int): Number of buckets, power of two.
+    """
+
+    def __init__(self, tick_ms=50, slots=64):
+        self.tick_ms = tick_ms
+        self.mask = slots - 1
+        self.slots = [[] for _ in range(slots)]
+        self.tick = 0  # current tick
+        self.count = 0  # armed timers, cancelled ones included until swept
+        self._t0 = ticks_ms()  # time of tick 0
+        self._wake = 0  # tick _run() sleeps until, earlier timers wake it
+        self._ev = asyncio.Event()
+        self._task = None
+
+    def schedule(self, delay_ms: int, cb, *args):
+        """
+        Calls cb(*args) after delay_ms, rounded up to the next tick.
+
+        Returns:
+            timer handle for cancel()
+        """
+        now = self.tick
+        if not self.count:
+            # idle, restart the clock from the current tick
+            self._t0 = ticks_add(ticks_ms(), -now * self.tick_ms)
+        else:
+            # the task may be asleep with self.tick behind the clock
+            now = max(now, ticks_diff(ticks_ms(), self._t0) // self.tick_ms)
+        at = now + max(1, (delay_ms + self.tick_ms - 1) // self.tick_ms)
+        timer = [at, cb, args]
+        self.slots[at & self.mask].append(timer)
+        self.count += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if self.count == 1 or at < self._wake:
+            self._ev.set()
+        return timer
+
+    @staticmethod
+    def cancel(timer):
+        # lazy removal, the entry is dropped when its bucket is visited
+        if timer:
+            timer[1] = None
+
+    def _advance(self):
+        # fire the bucket of the next tick
+        self.tick += 1
+        bucket = self.slots[self.tick & self.mask]
+        if not bucket:
+            return
+        due = [t for t in bucket if t[0] <= self.tick]
+        if len(due) == len(bucket):
+            bucket.clear()
+        else:
+            bucket[:] = [t for t in bucket if t[0] > self.tick]
+        self.count -= len(due)
+        for _, cb, args in due:
+            if cb is None:
+                continue
+            try:
+                cb(*args)
+            except Exception as e:
+                print(f"timer {cb} failed: {e}")
+
+    def _ticks_to_next(self) -> int:
+        # ticks until the first armed deadline, at most one turn of the wheel
+        n = len(self.slots)
+        for d in range(1, n + 1):
+            at = self.tick + d
+            for t in self.slots[at & self.mask]:
+                if t[0] <= at:
+                    return d
+        return n
+
+    async def _run(self):
+        while True:
+            if not self.count:
+                # idle, schedule() restarts the clock when armed
+                self._wake = 0
+                self._ev.clear()
+                await self._ev.wait()
+            # sleep through empty buckets, schedule() wakes us for an earlier timer
+            d = self._ticks_to_next()
+            self._wake = self.tick + d
+            self._ev.clear()
+            delay = ticks_diff(ticks_add(self._t0, self._wake * self.tick_ms), ticks_ms())
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._ev.wait(), delay / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            target = ticks_diff(ticks_ms(), self._t0) // self.tick_ms
+            while self.tick < target and self.count:
+                self._advance()
+            if not self.count:
+                self.tick = target
+
+
+wheel = TimerWheel()
@@ -0,0 +1,127 @@
+import asyncio
+from time import ticks_ms, ticks_diff, ticks_add
+
+from bdg.msg import BundleMsg, MAX_FRAME, send_message
+from bdg.msg.peers import peers
+
+# priority classes, lower goes first
+PRIO_CTRL = 0  # acks, connection control and their retries
+PRIO_DATA = 1  # connection channel frames
+PRIO_BEACON = 2
+
+
+class TxScheduler:
+    """
+    The one long lived task that puts frames on air.
+
+    Frames are queued per priority class and per mac. The task always serves
+    the highest non-empty class, round robin over macs, and packs everything
+    queued for the chosen mac, higher classes first, into one BundleMsg up
+    to MAX_FRAME. Beacons are held back while data frames are flowing, up to
+    beacon_yield_ms after the last one.
+
+    Attributes:
+        beacon_yield_ms (int): Quiet time on data before a beacon goes out.
+    """
+
+    beacon_yield_ms = 200
+
+    def __init__(self):
+        self.espnow = None
+        self.queues = ({}, {}, {})  # per class: {mac: [frame, ...]}
+        # per class: macs with queued frames in round robin order, dicts do
+        # not keep insertion order on MicroPython
+        self.order = ([], [], [])
+        self.last_data_ms = ticks_ms()
+        self._ev = asyncio.Event()
+        self._task = None
+        self._head = len(BundleMsg([]).srlz())
+
+    def start(self, espnow):
+        self.espnow = espnow
+        peers.start(espnow)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def put(self, mac, frame, prio=PRIO_DATA):
+        frames = self.queues[prio].get(mac)
+        if frames is None:
+            self._requeue(prio, mac, [frame])
+        else:
+            frames.append(frame)
+        self._ev.set()
+
+    def _requeue(self, prio, mac, frames):
+        # frames of mac go after the other macs of the class
+        self.queues[prio][mac] = frames
+        self.order[prio].append(mac)
+
+    def _pop(self, prio, mac):
+        frames = self.queues[prio].pop(mac, None)
+        if frames is not None:
+            self.order[prio].remove(mac)
+        return frames
+
+    def _take(self, mac, prio):
+        # pops frames of mac from class prio and lower until the frame is full
+        frames, size = [], self._head
+        for p in range(prio, len(self.queues)):
+            pending = self._pop(p, mac)
+            if pending is None:
+                continue
+            while pending and size + len(pending[0]) <= MAX_FRAME:
+                size += len(pending[0])
+                frames.append(pending.pop(0))
+            if pending:
+                self._requeue(p, mac, pending)
+                break
+        if not frames:
+            # single frame over the bundle limit
+            pending = self.queues[prio][mac]
+            frames.append(pending.pop(0))
+            if not pending:
+                self._pop(prio, mac)
+        if len(frames) == 1:
+            return frames[0]
+        return BundleMsg(frames).srlz()
+
+    async def _run(self):
+        ctrl, data, beacons = self.queues
+        while True:
+            if not (ctrl or data or beacons):
+                self._ev.clear()
+                await self._ev.wait()
+            if ctrl:
+                prio = PRIO_CTRL
+            elif data:
+                prio = PRIO_DATA
+                self.last_data_ms = ticks_ms()
+            else:
+                quiet = ticks_diff(ticks_ms(), self.last_data_ms)
+                if quiet < self.beacon_yield_ms:
+                    # yield to a session, anything queued meanwhile goes first
+                    self._ev.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._ev.wait(), (self.beacon_yield_ms - quiet) / 1000
+                        )
+                    except asyncio.TimeoutError:
+                        self.last_data_ms = ticks_add(ticks_ms(), -self.beacon_yield_ms)
+                    continue
+                prio = PRIO_BEACON
+            mac = self.order[prio][0]
+            frame = self._take(mac, prio)
+            try:
+                if not peers.ensure(mac):
+                    continue
+                await send_message(self.espnow, mac, frame, sync=False)
+            except Exception as e:
+                print(f"tx {mac} failed: {e}")
+
+
+tx = TxScheduler()
@@ -0,0 +1,127 @@
+import asyncio
+from collections import namedtuple
+
+from bdg.msg.timers import wheel
+
+# BadgeDiff.kind
+BADGE_ADDED = 0
+BADGE_REMOVED = 1
+BADGE_UPDATED = 2  # old holds the previous BadgeAdr
+BADGE_RESET = 3  # diffs were dropped, rebuild from NowListener.last_seen
+BadgeDiff = namedtuple("BadgeDiff", ["kind", "badge", "old"])
+
+
+class Subscription:
+    """
+    Async iterator of BadgeDiff batches, see UpdateBroker.subscribe().
+
+    Changes are coalesced per mac into the state the subscriber last got
+    and the latest state, so a badge that beacons ten times within a frame
+    is one BADGE_UPDATED and one that came and went is nothing at all.
+    """
+
+    def __init__(self, broker, filter_mac=None):
+        self.broker = broker
+        self.filter_mac = filter_mac
+        self.pending = {}  # mac -> [known BadgeAdr or None, latest BadgeAdr or None]
+        self.reset = False
+        self.ev = asyncio.Event()
+
+    def add(self, kind, badge, old):
+        mac = badge.mac
+        if self.reset or (self.filter_mac is not None and mac != self.filter_mac):
+            return
+        after = None if kind == BADGE_REMOVED else badge
+        entry = self.pending.get(mac)
+        if entry is not None:
+            entry[1] = after
+        elif len(self.pending) < self.broker.max_batch:
+            before = badge if kind == BADGE_REMOVED else old
+            self.pending[mac] = [before, after]
+        else:
+            # too much to catch up with, rebuilding is cheaper
+            self.pending.clear()
+            self.reset = True
+
+    def flush(self):
+        if self.pending or self.reset:
+            self.ev.set()
+
+    def batch(self) -> list:
+        if self.reset:
+            self.reset = False
+            return [BadgeDiff(BADGE_RESET, None, None)]
+        diffs = []
+        for before, after in self.pending.values():
+            if before is None:
+                if after is not None:
+                    diffs.append(BadgeDiff(BADGE_ADDED, after, None))
+            elif after is None:
+                diffs.append(BadgeDiff(BADGE_REMOVED, before, None))
+            else:
+                diffs.append(BadgeDiff(BADGE_UPDATED, after, before))
+        self.pending.clear()
+        return diffs
+
+    def close(self):
+        if self in self.broker.subs:
+            self.broker.subs.remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            try:
+                await self.ev.wait()
+            except asyncio.CancelledError:
+                self.close()
+                raise
+            self.ev.clear()
+            diffs = self.batch()
+            if diffs:
+                return diffs
+
+
+class UpdateBroker:
+    """
+    Hands neighbour table changes to the UI in batches.
+
+    publish() only records the change in every subscription, the batches
+    are released together once per frame_ms, so the wake up and redraw
+    rate of subscribers is bounded whatever the beacon rate is, and no
+    intermediate change is lost.
+
+    Attributes:
+        frame_ms (int): Batch interval.
+        max_batch (int): Macs a subscription collects before it falls back
+            to a single BADGE_RESET.
+    """
+
+    frame_ms = 250
+    max_batch = 128
+
+    def __init__(self, frame_ms=None):
+        if frame_ms:
+            self.frame_ms = frame_ms
+        self.subs = []
+        self.timer = None
+
+    def subscribe(self, filter_mac=None) -> Subscription:
+        sub = Subscription(self, filter_mac)
+        self.subs.append(sub)
+        return sub
+
+    def publish(self, kind, badge, old=None):
+        if not self.subs:
+            return
+        for sub in self.subs:
+            sub.add(kind, badge, old)
+        if self.timer is None:
+            self.timer = wheel.schedule(self.frame_ms, self._flush)
+
+    def _flush(self):
+        # wheel callback, end of frame
+        self.timer = None
+        for sub in self.subs:
+            sub.flush()
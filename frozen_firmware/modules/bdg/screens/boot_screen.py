@@ -4,6 +4,7 @@ import asyncio
 
 from bdg.msg import BeaconMsg
 from bdg.config import Config
+from bdg.game_registry import get_registry
 from bdg.version import Version
 from bdg.utils import blit
 from bdg.widgets.hidden_active_widget import HiddenActiveWidget
@@ -48,6 +49,7 @@ class BootScr(Screen):
         beaconmsg = BeaconMsg(nick)
 
         Beacon.setup(self.espnow, beaconmsg)
+        Beacon.set_games(g["con_id"] for g in get_registry().get_multiplayer_games())
         Beacon.start(task=True)
 
         NowListener.con_cb = new_con_cb
@@ -2,6 +2,7 @@ import asyncio
 
 from bdg.msg import BadgeAdr, null_badge_adr
 from bdg.msg.connection import NowListener, Beacon
+from bdg.msg.updates import BADGE_ADDED, BADGE_REMOVED, BADGE_RESET
 from bdg.game_registry import get_registry
 from bdg.widgets.hidden_active_widget import HiddenActiveWidget
 from gui.core.colors import GREEN, BLACK, D_PINK
@@ -28,6 +29,7 @@ class MultiplayerGameSelectionScreen(SimpleListScreen):
             title=f"Challenge: {badge_addr.nick}",
             listbox_dlines=6,
         )
+        self.show_busy()
     
     def init_subclass(self, **kwargs):
         """Add status label for connection feedback"""
@@ -39,22 +41,38 @@ class MultiplayerGameSelectionScreen(SimpleListScreen):
     def on_hide(self):
         """Clear status label when screen hides"""
         self.s_lbl.value("")
+
+    def badge(self):
+        """Latest beacon state of the challenged badge"""
+        mac = self.baddr.mac
+        if mac in NowListener.last_seen:
+            return NowListener.last_seen[mac]
+        return self.baddr
+
+    def show_busy(self):
+        """Show in status label if the badge told it is in a connection"""
+        busy = self.badge().busy
+        self.s_lbl.value("Busy in another game" if busy else "")
+        return busy
     
     def get_initial_elements(self):
-        """Return list of multiplayer game titles"""
+        """Return titles of the multiplayer games the other badge has too"""
         games = [
             game["title"] for game in self.games 
-            if game.get("multiplayer", False)
+            if game.get("multiplayer", False) and self.baddr.supports(game["con_id"])
         ]
         return games if games else None
     
     def get_empty_message(self):
         """Message to show when no multiplayer games available"""
-        return "No multiplayer games available"
+        return "No common multiplayer games"
     
     def on_item_selected(self, listbox):
         """Launch selected game"""
         game_title = listbox.textvalue()
+        if self.show_busy():
+            # would be auto-declined, skip the handshake
+            return
         
         for game in self.games:
             if game["title"] == game_title:
@@ -81,7 +99,7 @@ class ScannerScreen(Screen):
         super().__init__()
         self.espnow = espnow
         self.update_task = None
-        self.max_badges = NowListener.last_seen.max_size
+        self.count = None  # badges shown in the title
         
         # Title writer with freesans20 font
         wri = CWriter(ssd, freesans20, GREEN, BLACK, verbose=False)
@@ -97,10 +115,11 @@ class ScannerScreen(Screen):
             bdcolor=False,
             justify=Label.CENTRE,
         )
-        self.lbl_title.value(f"{self.max_badges} near badges")
+        self.show_count()
 
         # Initialize with placeholder
-        self.elements = [("No badges found, looking..", dolittle, (null_badge_adr,))]
+        self.elements = [self.placeholder()]
+        self.keys = []  # sort keys of elements, see badge_key()
         self.listbox = Listbox(
             wri_pink,
             50,
@@ -125,51 +144,123 @@ class ScannerScreen(Screen):
         if not self.update_task or self.update_task.done():
             self.update_task = self.reg_task(self.update_resuls_task(), True)
 
+    def show_count(self):
+        """Show the number of badges in NowListener.last_seen in the title."""
+        n = len(NowListener.last_seen)
+        if n != self.count:
+            self.count = n
+            self.lbl_title.value(f"{n} near badges")
+
+    @staticmethod
+    def placeholder():
+        return ("No badges found, looking..", dolittle, (null_badge_adr,))
+
+    @staticmethod
+    def badge_key(badge):
+        # alphabetically by nickname (case-insensitive), mac keeps keys unique
+        return (badge.nick.lower(), badge.mac)
+
+    def element(self, badge):
+        return (f"{badge.nick} [{badge.rssi}dBm]", self.cb, (badge,))
+
     def rebuild_list(self):
         """Rebuild the badge list from NowListener.last_seen."""
         
         # Get all current badges from NowListener
-        current_badges = list(NowListener.last_seen.values())
+        current_badges = sorted(NowListener.last_seen.values(), key=self.badge_key)
         
         # Clear the existing list (modifying in place)
         self.elements.clear()
+        self.keys = [self.badge_key(badge) for badge in current_badges]
         
         if not current_badges:
             # No badges found, show placeholder
-            self.elements.append(("No badges found, looking..", dolittle, (null_badge_adr,)))
+            self.elements.append(self.placeholder())
         else:
-            # Build new elements from current badges
-            new_elements = [
-                (
-                    f"{badge.nick} [{badge.rssi}dBm]",
-                    self.cb,
-                    (badge,),
-                )
-                for badge in current_badges
-            ]
-            # Sort alphabetically by nickname (case-insensitive)
-            new_elements.sort(key=lambda a: a[2][0].nick.lower())
-            
-            # Add sorted elements to the list
-            self.elements.extend(new_elements)
+            self.elements.extend(self.element(badge) for badge in current_badges)
         
         # Update listbox display
         if hasattr(self, "listbox"):
             self.listbox.update()
+        self.show_count()
+
+    def _find(self, key):
+        # leftmost position of key in the sorted keys
+        lo, hi = 0, len(self.keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.keys[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _insert(self, badge):
+        key = self.badge_key(badge)
+        i = self._find(key)
+        if i < len(self.keys) and self.keys[i] == key:
+            self.elements[i] = self.element(badge)  # already listed
+            return i
+        if not self.keys:
+            self.elements.clear()  # drop placeholder
+        self.keys.insert(i, key)
+        self.elements.insert(i, self.element(badge))
+        return i
+
+    def _remove(self, badge):
+        key = self.badge_key(badge)
+        i = self._find(key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None  # not listed
+        del self.keys[i]
+        del self.elements[i]
+        if not self.keys:
+            self.elements.append(self.placeholder())
+        return i
+
+    def apply_diff(self, diff):
+        """
+        Apply one NowListener.updates() diff to the sorted list.
+
+        Returns:
+            Lowest changed index, None when the list did not change.
+        """
+        if diff.kind == BADGE_RESET:
+            self.rebuild_list()
+            return None
+        if diff.kind == BADGE_ADDED:
+            return self._insert(diff.badge)
+        if diff.kind == BADGE_REMOVED:
+            return self._remove(diff.badge)
+        # updated, moves only if the nick changed
+        i = self._remove(diff.old)
+        j = self._insert(diff.badge)
+        return j if i is None else min(i, j)
 
     async def update_resuls_task(self):
         try:
             NowListener.start(self.espnow)  # ensure scanner is running
             Beacon.suspend(False)  # ensure that we have beacon on
 
-            # initial update - rebuild entire list
-            self.rebuild_list()
-
-            # wait for changes (both additions and removals)
-            async for latest_badge in NowListener.updates():
-                # Rebuild entire list on any change
-                # This handles both additions and removals (from cleanup_stale)
+            # subscribe first so no change is missed, then build the list once
+            updates = NowListener.updates()
+            try:
                 self.rebuild_list()
-                await asyncio.sleep(0)
+
+                # apply each batch of changes (additions, removals from
+                # expiry and eviction, and updates), redraw once and only
+                # when a visible line or the ones above it changed
+                async for batch in updates:
+                    changed = None
+                    for diff in batch:
+                        i = self.apply_diff(diff)
+                        if i is not None and (changed is None or i < changed):
+                            changed = i
+                    self.show_count()
+                    if changed is not None and changed < self.listbox.ntop + self.listbox.dlines:
+                        self.listbox.update()
+                    await asyncio.sleep(0)
+            finally:
+                updates.close()
         except Exception as e:
             print(f"update_resuls_task: {e}")